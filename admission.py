@@ -0,0 +1,302 @@
+import contextvars
+import logging
+import threading
+import time
+import weakref
+from collections import OrderedDict, deque
+from concurrent.futures import CancelledError, Future, wait as wait_futures
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+from config.settings import (
+    LLM_MAX_CONCURRENT, LLM_TASK_PRIORITIES, LLM_QUEUE_TIMEOUT, LLM_REQUEST_TIMEOUT,
+    LLM_QUEUE_POLL_INTERVAL
+)
+from helpers.llm_backend import LLMBackend
+
+
+# Set per Streamlit rerun so requests are queued and cancelled per browser session
+_current_session = contextvars.ContextVar("llm_session", default=None)
+_position_callback = contextvars.ContextVar("llm_queue_position_callback", default=None)
+_controllers = weakref.WeakSet()
+
+
+def set_session(session_id: Optional[str]):
+    """Attribute LLM requests made from the current context to a session."""
+    _current_session.set(session_id)
+
+
+def cancel_session(session_id: Optional[str]) -> int:
+    """Cancel a session's queued and running requests (e.g. left over from a previous rerun)."""
+    if session_id is None:
+        return 0
+    return sum(controller.cancel_session(session_id) for controller in list(_controllers))
+
+
+@contextmanager
+def queue_position_callback(fn: Callable[[Optional[int]], None]):
+    """Call ``fn(position)`` while requests from this context wait for a slot.
+
+    ``position`` is 1 for the next request to run and ``None`` once the
+    request is running.
+    """
+    token = _position_callback.set(fn)
+    try:
+        yield
+    finally:
+        _position_callback.reset(token)
+
+
+class _Request:
+    """One prompt waiting for (or holding) a slot on the wrapped backend."""
+
+    def __init__(self, prompt: str, kwargs: Dict, task: str, priority: int, session_id: Optional[str]):
+        self.prompt = prompt
+        self.kwargs = kwargs
+        self.task = task
+        self.priority = priority
+        self.session_id = session_id
+        self.future = Future()
+        self.inner: Optional[Future] = None
+        self.enqueued = time.perf_counter()
+        self.started = None
+
+
+class AdmissionBackend(LLMBackend):
+    """Process-wide admission control in front of another backend.
+
+    At most ``max_concurrent`` requests run on the wrapped backend at once,
+    so concurrent sessions never oversubscribe the CPU. Waiting requests are
+    ordered by task priority (``LLM_TASK_PRIORITIES``, lower runs first) and,
+    within a priority, round-robin across sessions, so one session's batch of
+    summaries cannot starve another session's question.
+
+    Requests that wait longer than ``queue_timeout`` fail with
+    ``TimeoutError``. Cancelling a returned future drops a queued request, or
+    cancels the running one where the wrapped backend allows it.
+
+    ``task_backends`` sends the requests of some tasks to another backend
+    (e.g. "qa" to speculative decoding); they still share this queue and its
+    ``max_concurrent`` slots with everything else.
+    """
+
+    name = "admission"
+
+    def __init__(self, backend: LLMBackend, max_concurrent: int = LLM_MAX_CONCURRENT,
+                 queue_timeout: float = LLM_QUEUE_TIMEOUT,
+                 task_backends: Optional[Dict[str, LLMBackend]] = None):
+        self.logger = logging.getLogger(__name__)
+        self.backend = backend
+        self.task_backends = dict(task_backends or {})
+        self.max_concurrent = max_concurrent or backend.capacity
+        self.queue_timeout = queue_timeout
+
+        # priority -> session id -> requests; sessions rotate to the back once served
+        self._queues: Dict[int, "OrderedDict[Optional[str], deque]"] = {}
+        self._running = set()
+        self._condition = threading.Condition()
+        self._closed = False
+        self._dispatcher = threading.Thread(target=self._run, name="llm-admission", daemon=True)
+        self._dispatcher.start()
+        _controllers.add(self)
+
+    def submit(self, prompt: str, task: str = "llm", session_id: Optional[str] = None,
+               **kwargs) -> Future:
+        """Queue a prompt; ``task`` selects its priority, ``session_id`` defaults to the context's."""
+        request = _Request(
+            prompt, kwargs, task,
+            LLM_TASK_PRIORITIES.get(task, LLM_TASK_PRIORITIES["llm"]),
+            session_id if session_id is not None else _current_session.get()
+        )
+        request.future.add_done_callback(lambda _: self._on_done(request))
+
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("LLM admission queue is shut down.")
+            sessions = self._queues.setdefault(request.priority, OrderedDict())
+            sessions.setdefault(request.session_id, deque()).append(request)
+            self._condition.notify()
+        return request.future
+
+    def wait(self, future: Future, timeout: Optional[float] = LLM_REQUEST_TIMEOUT) -> str:
+        """Block until ``future`` has a result, reporting its queue position meanwhile.
+
+        The request is cancelled if ``timeout`` expires or the waiting code is
+        interrupted, e.g. when Streamlit stops a script for a rerun.
+        """
+        callback = _position_callback.get()
+        deadline = time.perf_counter() + timeout if timeout else None
+        try:
+            while True:
+                if callback:
+                    callback(self.position(future))
+                done, _ = wait_futures([future], timeout=LLM_QUEUE_POLL_INTERVAL)
+                if done:
+                    break
+                if deadline and time.perf_counter() > deadline:
+                    raise TimeoutError(f"LLM request did not finish within {timeout:g}s.")
+        finally:
+            if not future.done():
+                future.cancel()
+        # Outside the loop, so the request's own errors (including a queue
+        # TimeoutError) propagate instead of being taken for a poll timeout.
+        return future.result()
+
+    def position(self, future: Future) -> Optional[int]:
+        """1-based place of a queued request in dispatch order, ``None`` if it is not queued."""
+        with self._condition:
+            order = 0
+            for priority in sorted(self._queues):
+                queues = [[r for r in queue if not r.future.cancelled()]
+                          for queue in self._queues[priority].values()]
+                # Round-robin dispatch takes the i-th request of every session in turn.
+                for i in range(max(map(len, queues), default=0)):
+                    for queue in queues:
+                        if i < len(queue):
+                            order += 1
+                            if queue[i].future is future:
+                                return order
+        return None
+
+    def cancel_session(self, session_id: str) -> int:
+        with self._condition:
+            requests = [r for sessions in self._queues.values() for r in sessions.get(session_id, ())]
+            requests += [r for r in self._running if r.session_id == session_id]
+        return sum(request.future.cancel() for request in requests)
+
+    def _pop_next(self) -> Optional[_Request]:
+        for priority in sorted(self._queues):
+            sessions = self._queues[priority]
+            while sessions:
+                session_id, queue = next(iter(sessions.items()))
+                request = queue.popleft()
+                if queue:
+                    sessions.move_to_end(session_id)
+                else:
+                    del sessions[session_id]
+                if not request.future.cancelled():
+                    return request
+            del self._queues[priority]
+        return None
+
+    def _expire(self) -> Optional[float]:
+        """Drop cancelled and timed-out requests; return seconds until the next timeout."""
+        now = time.perf_counter()
+        next_timeout = None
+        for priority, sessions in list(self._queues.items()):
+            for session_id, queue in list(sessions.items()):
+                kept = deque()
+                for request in queue:
+                    if request.future.cancelled():
+                        continue
+                    remaining = request.enqueued + self.queue_timeout - now if self.queue_timeout else None
+                    if remaining is not None and remaining <= 0:
+                        if request.future.set_running_or_notify_cancel():
+                            request.future.set_exception(TimeoutError(
+                                f"Waited more than {self.queue_timeout:g}s for a free model slot."
+                            ))
+                        continue
+                    kept.append(request)
+                    if remaining is not None:
+                        next_timeout = remaining if next_timeout is None else min(next_timeout, remaining)
+                if kept:
+                    sessions[session_id] = kept
+                else:
+                    del sessions[session_id]
+            if not sessions:
+                del self._queues[priority]
+        return next_timeout
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while True:
+                    if self._closed:
+                        return
+                    next_timeout = self._expire()
+                    request = self._pop_next() if len(self._running) < self.max_concurrent else None
+                    if request is not None:
+                        break
+                    self._condition.wait(next_timeout)
+                self._running.add(request)
+            self._start(request)
+
+    def _start(self, request: _Request):
+        request.started = time.perf_counter()
+        try:
+            backend = self.task_backends.get(request.task, self.backend)
+            request.inner = backend.submit(request.prompt, **request.kwargs)
+        except Exception as e:
+            self._finish(request, error=e)
+            return
+        if request.future.cancelled():
+            request.inner.cancel()
+        request.inner.add_done_callback(lambda _: self._finish(request))
+
+    def _finish(self, request: _Request, error: Optional[Exception] = None):
+        with self._condition:
+            self._running.discard(request)
+            self._condition.notify()
+
+        future, inner = request.future, request.inner
+        # Set before the result so waiters always see the timings.
+        future.timings = {
+            "admission_wait": request.started - request.enqueued,
+            **(getattr(inner, "timings", None) or {"generate": time.perf_counter() - request.started})
+        }
+        if not future.set_running_or_notify_cancel():
+            return
+        if error is None:
+            if inner.cancelled():
+                error = CancelledError()
+            else:
+                error = inner.exception()
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(inner.result())
+
+    def _on_done(self, request: _Request):
+        if not request.future.cancelled():
+            return
+        from helpers.telemetry import get_telemetry
+
+        get_telemetry().incr("llm_cancelled_total", task=request.task)
+        if request.inner is not None:
+            request.inner.cancel()
+
+    def count_tokens(self, text: str) -> int:
+        return self.backend.count_tokens(text)
+
+    @property
+    def generated_tokens(self) -> int:
+        return self.backend.generated_tokens
+
+    @property
+    def capacity(self) -> int:
+        return self.max_concurrent
+
+    @property
+    def context_length(self) -> int:
+        return min(backend.context_length for backend in [self.backend, *self.task_backends.values()])
+
+    @property
+    def queue_depth(self) -> int:
+        with self._condition:
+            queued = sum(not r.future.cancelled() for sessions in self._queues.values()
+                         for queue in sessions.values() for r in queue)
+        return queued + sum(backend.queue_depth for backend in [self.backend, *self.task_backends.values()])
+
+    def shutdown(self):
+        with self._condition:
+            self._closed = True
+            queued: List[_Request] = [r for sessions in self._queues.values()
+                                      for queue in sessions.values() for r in queue]
+            self._queues.clear()
+            self._condition.notify()
+        for request in queued:
+            request.future.cancel()
+        self._dispatcher.join()
+        self.backend.shutdown()
+        for backend in self.task_backends.values():
+            backend.shutdown()
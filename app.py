@@ -1,12 +1,14 @@
 import streamlit as st
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Dict
+from typing import Dict, Optional
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 
-# Import custom modules
-from src.document_processor import DocumentProcessor
-from src.vector_store import VectorStoreManager
-from helpers.langchain_helper import LangChainHelper
+# Import custom modules (models and parsers are imported lazily by the warm-up)
 from helpers.ui_helper import UIHelper
+from helpers.warmup import start_warmup
+from helpers.telemetry import get_telemetry
+from helpers.profiler import enable_for_request, profiled
 from config.settings import PAGE_TITLE, PAGE_ICON, LAYOUT, SIDEBAR_STATE, SUPPORTED_FORMATS, MODEL_CONTEXT_LENGTH
 
 
@@ -22,11 +24,83 @@ class AIResearchAssistant:
 
     def __init__(self):
         self.ui_helper = UIHelper()
-        self.document_processor = DocumentProcessor()
-        self.vector_store = VectorStoreManager()
-        self.langchain_helper = LangChainHelper()
+        self.warmup = start_warmup()
+        self.telemetry = get_telemetry()
+        ctx = get_script_run_ctx()
+        self.session_id = ctx.session_id if ctx else None
+        self._session_bound = False
         self._initialize_session_state()
 
+    def _wait_for_models(self):
+        """Block until the background warm-up has loaded the models."""
+        if not self.warmup.is_ready:
+            with st.spinner("Loading models..."):
+                self.warmup.wait()
+        if not self._session_bound:
+            # Queue this rerun's LLM requests under the browser session and drop
+            # whatever an interrupted previous rerun left in the queue.
+            from helpers.admission import set_session, cancel_session
+
+            set_session(self.session_id)
+            cancel_session(self.session_id)
+            self._session_bound = True
+
+    @contextmanager
+    def _queue_status(self):
+        """Show this session's place in the shared LLM queue while a request waits."""
+        self._wait_for_models()
+        from helpers.admission import queue_position_callback
+
+        placeholder = st.empty()
+
+        def show(position: Optional[int]):
+            if position:
+                placeholder.caption(f"⏳ Waiting for the model: position {position} in the queue")
+            else:
+                placeholder.empty()
+
+        with queue_position_callback(show):
+            try:
+                yield
+            finally:
+                placeholder.empty()
+
+    @property
+    def document_processor(self):
+        """Shared document processor (waits for warm-up on first use)."""
+        self._wait_for_models()
+        from src.document_processor import get_document_processor
+        return get_document_processor()
+
+    @property
+    def vector_store(self):
+        """Shared vector store (waits for warm-up on first use)."""
+        self._wait_for_models()
+        from src.vector_store import get_vector_store
+        return get_vector_store()
+
+    @property
+    def langchain_helper(self):
+        """Shared LangChain helper (waits for warm-up on first use)."""
+        self._wait_for_models()
+        from helpers.langchain_helper import get_langchain_helper
+        return get_langchain_helper()
+
+    @property
+    def question_bank(self):
+        """Shared per-document question bank (waits for warm-up on first use)."""
+        self._wait_for_models()
+        from src.question_bank import get_question_bank
+        return get_question_bank()
+
+    def _model_status(self) -> str:
+        """Human-readable warm-up status for the sidebar."""
+        if self.warmup.is_ready:
+            return "Ready"
+        if self.warmup.error:
+            return f"Failed ({self.warmup.error})"
+        return "Loading models..."
+
     def _initialize_session_state(self):
         """Initialize Streamlit session state variables."""
         if 'documents' not in st.session_state:
@@ -90,9 +164,10 @@ class AIResearchAssistant:
             **Model:** LLaMA-2-7B-Chat
             **Format:** GGUF (Quantized)
             **Context:** {MODEL_CONTEXT_LENGTH:,} tokens
-            **Status:** Ready
+            **Status:** {self._model_status()}
             """)
 
+    @profiled("ingest")
     def process_uploaded_files(self, uploaded_files):
         """Process uploaded files and update session state."""
         progress_bar = st.progress(0)
@@ -103,17 +178,25 @@ class AIResearchAssistant:
             progress_bar.progress(progress)
             status_text.text(f"Processing {uploaded_file.name}...")
 
-            # Process document
-            result = self.document_processor.process_document(uploaded_file)
+            with self._queue_status(), self.telemetry.trace("ingest", filename=uploaded_file.name):
+                # Process document
+                result = self.document_processor.process_document(uploaded_file)
+
+                if result["success"]:
+                    # Create embeddings and store in vector database
+                    doc_id = self.vector_store.add_document(
+                        result["content"]["chunks"], result["content"]["metadata"],
+                        result["content"]["chunk_offsets"]
+                    )
+                    # Challenge questions are generated in the background from the whole document
+                    if doc_id:
+                        self.question_bank.build_async(
+                            result["content"]["metadata"]["content_hash"], result["content"]["chunks"]
+                        )
 
             if result["success"]:
-                # Store in vector database
-                chunks = result["content"]["chunks"]
                 metadata = result["content"]["metadata"]
 
-                # Create embeddings and store
-                doc_id = self.vector_store.add_document(chunks, metadata)
-
                 # Add to session state
                 document_data = {
                     "id": doc_id,
@@ -209,14 +292,9 @@ class AIResearchAssistant:
 
         if ask_button and question:
             with st.spinner("Analyzing document and generating response..."):
-                # Query vector store
-                retriever = self.vector_store.get_retriever()
-                qa_chain = self.langchain_helper.create_qa_chain(
-                    self.vector_store.get_vectorstore()
-                )
-
                 try:
-                    result = qa_chain({"query": question})
+                    with self._queue_status(), self.telemetry.trace("qa"):
+                        result = self.langchain_helper.answer_question(self.vector_store, question)
                     answer = result["result"]
                     source_docs = result["source_documents"]
 
@@ -258,16 +336,17 @@ class AIResearchAssistant:
 
         col1, col2 = st.columns([1, 1])
 
-        with col1:
-            if st.button("🎲 Generate Questions", type="primary"):
-                self.generate_challenge_questions()
-
+        # Read the difficulty first so the button below uses the current selection
         with col2:
             difficulty = st.selectbox(
                 "Difficulty Level:",
                 ["Mixed", "Easy", "Medium", "Hard"]
             )
 
+        with col1:
+            if st.button("🎲 Generate Questions", type="primary"):
+                self.generate_challenge_questions(difficulty)
+
         # Display generated questions
         if st.session_state.generated_questions:
             for idx, q_data in enumerate(st.session_state.generated_questions):
@@ -295,19 +374,40 @@ class AIResearchAssistant:
                         else:
                             st.warning("Please provide an answer before evaluation.")
 
-    def generate_challenge_questions(self):
-        """Generate challenge questions from current document."""
+    def generate_challenge_questions(self, difficulty: str = "Mixed"):
+        """Serve challenge questions from the document's question bank.
+
+        Falls back to generating questions on demand when the document has no
+        bank (or its build produced no questions).
+        """
         doc = st.session_state.current_document
+        bank = self.question_bank
+        bank_key = doc['metadata']['content_hash']
+        status = bank.status(bank_key)
+
+        questions = bank.sample(bank_key, None if difficulty == "Mixed" else difficulty)
+        if not questions and difficulty != "Mixed" and bank.progress(bank_key)[2]:
+            st.warning(f"No {difficulty.lower()} questions in the bank yet; showing mixed difficulty.")
+            questions = bank.sample(bank_key)
+        if questions:
+            st.session_state.generated_questions = questions
+            st.success(f"✅ Picked {len(questions)} questions from across the document!")
+            return
+        if status == "building":
+            done, total, _ = bank.progress(bank_key)
+            st.info(f"⏳ Questions are still being prepared ({done}/{total} sections). Try again in a moment.")
+            return
 
         with st.spinner("Generating challenging questions..."):
             # Use sample text from document
             sample_text = doc['raw_text'][:3000]  # Limit for efficiency
 
             try:
-                questions = self.langchain_helper.generate_questions(
-                    context=sample_text,
-                    question_type="mixed"
-                )
+                with self._queue_status(), self.telemetry.trace("challenge_questions"):
+                    questions = self.langchain_helper.generate_questions(
+                        context=sample_text,
+                        question_type="mixed"
+                    )
 
                 st.session_state.generated_questions = questions
                 st.success(f"✅ Generated {len(questions)} questions!")
@@ -321,11 +421,12 @@ class AIResearchAssistant:
 
         with st.spinner("Evaluating your answer..."):
             try:
-                evaluation = self.langchain_helper.evaluate_answer(
-                    question=question_data['question'],
-                    user_answer=user_answer,
-                    context=question_data['source_context']
-                )
+                with self._queue_status(), self.telemetry.trace("evaluate"):
+                    evaluation = self.langchain_helper.evaluate_answer(
+                        question=question_data['question'],
+                        user_answer=user_answer,
+                        context=question_data['source_context']
+                    )
 
                 # Display evaluation results
                 col1, col2 = st.columns([1, 2])
@@ -359,6 +460,31 @@ class AIResearchAssistant:
             except Exception as e:
                 st.error(f"Evaluation failed: {e}")
 
+    def render_diagnostics(self):
+        """Render the hidden diagnostics panel (open the app with ?diagnostics=1)."""
+        import pandas as pd
+
+        st.markdown("### 🩺 Diagnostics")
+        traces = self.telemetry.recent_traces()
+        if not traces:
+            st.info("No traces recorded yet.")
+        else:
+            rows = []
+            for trace in reversed(traces):
+                rows.append({
+                    "trace": trace.id,
+                    "operation": trace.name,
+                    "started": datetime.fromtimestamp(trace.started_at).strftime("%H:%M:%S"),
+                    "total_ms": round((trace.duration or 0) * 1000, 1),
+                    "error": trace.error or "",
+                    **{f"{stage}_ms": round(ms, 1) for stage, ms in trace.stage_latency().items()}
+                })
+            st.dataframe(pd.DataFrame(rows).fillna(""), use_container_width=True)
+
+        with st.expander("Prometheus metrics"):
+            st.code(self.telemetry.prometheus_text(), language="text")
+
+    @profiled("rerun")
     def run(self):
         """Main application entry point."""
         # Load custom CSS
@@ -369,6 +495,9 @@ class AIResearchAssistant:
         self.render_sidebar()
         self.render_main_content()
 
+        if st.query_params.get("diagnostics") == "1":
+            self.render_diagnostics()
+
         # Footer
         st.markdown("---")
         st.markdown("""
@@ -380,6 +509,7 @@ class AIResearchAssistant:
 
 # Application entry point
 def main():
+    enable_for_request(st.query_params.get("profile") == "1")
     app = AIResearchAssistant()
     app.run()
 
@@ -0,0 +1,297 @@
+import ctypes
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Dict, List, Optional
+
+import numpy as np
+import llama_cpp
+
+# The decoder drives llama.cpp through llama-cpp-python internals
+# (``_internals._LlamaTokenDataArray``, ``Llama._ctx.ctx``) that change
+# between releases; it is written against the version in requirements.txt.
+SUPPORTED_LLAMA_CPP_VERSION = "0.2.55"
+try:
+    from llama_cpp._internals import _LlamaTokenDataArray
+except ImportError as e:
+    raise ImportError(
+        f"The batched LLM backend needs llama-cpp-python {SUPPORTED_LLAMA_CPP_VERSION} "
+        f"(found {getattr(llama_cpp, '__version__', 'unknown')}); use LLM_BACKEND=llamacpp."
+    ) from e
+
+from config.settings import (
+    MODEL_PATH, MODEL_MAX_TOKENS, MODEL_TEMPERATURE,
+    LLM_THREADS, LLM_BATCH_SIZE, LLM_BATCH_MAX_SEQUENCES, LLM_BATCH_CONTEXT_PER_SEQUENCE
+)
+from helpers.llm_backend import build_grammar
+
+
+class _Sequence:
+    """State of one prompt inside the batched decoder."""
+
+    def __init__(self, prompt_tokens: List[int], max_tokens: int, temperature: float,
+                 top_p: float, repeat_penalty: float, stop: List[str], grammar, future: Future):
+        self.prompt_tokens = prompt_tokens
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.top_p = top_p
+        self.repeat_penalty = repeat_penalty
+        self.stop = stop
+        self.grammar = grammar
+        self.future = future
+        self.submitted_at = time.perf_counter()
+        self.admitted_at = None
+        self.first_token_at = None
+        self.slot = None
+        self.n_past = 0          # tokens already in the KV cache
+        self.generated = []      # sampled token ids
+        self.text = ""
+        self.rng = np.random.default_rng()
+
+    @property
+    def prefilling(self) -> bool:
+        return self.n_past < len(self.prompt_tokens)
+
+
+class InferenceScheduler:
+    """Run many prompts through one llama.cpp context with batched decoding.
+
+    Each active prompt owns a sequence id (slot) in a shared KV cache. Every
+    decode step puts one token per generating sequence into a single
+    ``llama_decode`` batch, and fills the remaining batch capacity with
+    prompt tokens from sequences that are still prefilling, round-robin, so
+    a long prompt never stalls the sequences that are already generating.
+
+    ``submit`` returns a ``concurrent.futures.Future``. The future stays
+    pending until the text is complete, so ``future.cancel()`` works at any
+    time and frees the sequence slot on the next step.
+    """
+
+    def __init__(self, model_path: str = MODEL_PATH, n_threads: int = LLM_THREADS,
+                 n_batch: int = LLM_BATCH_SIZE, max_sequences: int = LLM_BATCH_MAX_SEQUENCES,
+                 context_per_sequence: int = LLM_BATCH_CONTEXT_PER_SEQUENCE):
+        self.logger = logging.getLogger(__name__)
+        if getattr(llama_cpp, "__version__", None) != SUPPORTED_LLAMA_CPP_VERSION:
+            self.logger.warning(f"Batched decoding is written against llama-cpp-python "
+                                f"{SUPPORTED_LLAMA_CPP_VERSION}, found {getattr(llama_cpp, '__version__', 'unknown')}")
+        self.model = llama_cpp.Llama(
+            model_path=model_path,
+            n_ctx=context_per_sequence * max_sequences,
+            n_batch=n_batch,
+            n_threads=n_threads,
+            verbose=False
+        )
+        self.ctx = getattr(getattr(self.model, "_ctx", None), "ctx", None)
+        if self.ctx is None:
+            raise RuntimeError(f"This llama-cpp-python version does not expose Llama._ctx.ctx; "
+                               f"the batched backend needs {SUPPORTED_LLAMA_CPP_VERSION}.")
+        self.n_vocab = self.model.n_vocab()
+        self.eos_token = self.model.token_eos()
+        self.n_batch = n_batch
+        self.max_sequences = max_sequences
+        self.context_per_sequence = context_per_sequence
+        self.batch = llama_cpp.llama_batch_init(n_batch, 0, max_sequences)
+
+        self.pending = deque()
+        self.active: Dict[int, _Sequence] = {}
+        self.free_slots = list(range(max_sequences))
+        self.generated_tokens = 0
+
+        self._condition = threading.Condition()
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, name="llm-batch-scheduler", daemon=True)
+        self._worker.start()
+
+    def submit(self, prompt: str, max_tokens: int = MODEL_MAX_TOKENS,
+               temperature: float = MODEL_TEMPERATURE, top_p: float = 0.95,
+               repeat_penalty: float = 1.1, stop: Optional[List[str]] = None,
+               grammar: Optional[str] = None, json_schema: Optional[str] = None) -> Future:
+        """Queue a prompt for generation and return a future for its text."""
+        future = Future()
+        tokens = self.model.tokenize(prompt.encode("utf-8"), add_bos=True)
+        # Like llama.cpp's own completion call, refuse prompts that don't fit rather than cut them.
+        if len(tokens) + max_tokens > self.context_per_sequence:
+            future.set_exception(ValueError(
+                f"Prompt of {len(tokens)} tokens plus {max_tokens} new tokens exceeds the "
+                f"{self.context_per_sequence}-token context of a batch slot."
+            ))
+            return future
+
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("Inference scheduler is shut down.")
+            self.pending.append(_Sequence(tokens, max_tokens, temperature, top_p, repeat_penalty,
+                                          stop or [], build_grammar(grammar, json_schema), future))
+            self._condition.notify()
+        return future
+
+    def map(self, prompts: List[str], **kwargs) -> List[Future]:
+        """Submit several prompts at once; results come back in order."""
+        return [self.submit(prompt, **kwargs) for prompt in prompts]
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self.pending) + len(self.active)
+
+    def shutdown(self):
+        """Stop the worker thread and release the batch buffer."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._worker.join()
+        llama_cpp.llama_batch_free(self.batch)
+
+    def _release(self, seq: _Sequence):
+        llama_cpp.llama_kv_cache_seq_rm(self.ctx, seq.slot, -1, -1)
+        del self.active[seq.slot]
+        self.free_slots.append(seq.slot)
+
+    def _admit(self):
+        """Drop cancelled work and move pending prompts into free slots (FIFO)."""
+        for seq in [s for s in self.active.values() if s.future.cancelled()]:
+            self._release(seq)
+
+        while self.pending and self.free_slots:
+            seq = self.pending.popleft()
+            if seq.future.cancelled():
+                continue
+            seq.slot = self.free_slots.pop()
+            seq.admitted_at = time.perf_counter()
+            self.active[seq.slot] = seq
+
+    def _fill_batch(self) -> List[tuple]:
+        """Build one decode batch; return (batch index, sequence) pairs to sample."""
+        batch = self.batch
+        n = 0
+        to_sample = []
+
+        def add(token, pos, slot, logits):
+            nonlocal n
+            batch.token[n] = token
+            batch.pos[n] = pos
+            batch.n_seq_id[n] = 1
+            batch.seq_id[n][0] = slot
+            batch.logits[n] = logits
+            n += 1
+
+        # Generating sequences first: one token each.
+        for seq in self.active.values():
+            if not seq.prefilling and seq.generated:
+                to_sample.append((n, seq))
+                add(seq.generated[-1], seq.n_past, seq.slot, True)
+                seq.n_past += 1
+
+        # Share the remaining capacity between prefilling sequences.
+        prefilling = [seq for seq in self.active.values() if seq.prefilling]
+        while prefilling and n < self.n_batch:
+            share = max(1, (self.n_batch - n) // len(prefilling))
+            for seq in list(prefilling):
+                take = min(share, len(seq.prompt_tokens) - seq.n_past, self.n_batch - n)
+                for token in seq.prompt_tokens[seq.n_past:seq.n_past + take]:
+                    add(token, seq.n_past, seq.slot, False)
+                    seq.n_past += 1
+                if not seq.prefilling:
+                    batch.logits[n - 1] = True
+                    to_sample.append((n - 1, seq))
+                    prefilling.remove(seq)
+                if n >= self.n_batch:
+                    break
+
+        batch.n_tokens = n
+        return to_sample
+
+    def _sample(self, seq: _Sequence, batch_index: int) -> int:
+        logits = np.ctypeslib.as_array(
+            llama_cpp.llama_get_logits_ith(self.ctx, batch_index), shape=(self.n_vocab,)
+        ).astype(np.float32)
+
+        if seq.repeat_penalty != 1.0 and seq.generated:
+            recent = np.unique(seq.generated[-64:])
+            penalized = logits[recent]
+            logits[recent] = np.where(penalized > 0, penalized / seq.repeat_penalty,
+                                      penalized * seq.repeat_penalty)
+
+        if seq.grammar is not None:
+            # Let llama.cpp mask every token the grammar cannot accept next.
+            candidates = _LlamaTokenDataArray(n_vocab=self.n_vocab)
+            candidates.copy_logits(logits)
+            llama_cpp.llama_sample_grammar(self.ctx, ctypes.byref(candidates.candidates), seq.grammar.grammar)
+            logits = candidates.candidates_data["logit"].astype(np.float32)
+
+        if seq.temperature <= 0:
+            return int(np.argmax(logits))
+
+        logits /= seq.temperature
+        probs = np.exp(logits - logits.max())
+        probs /= probs.sum()
+        if seq.top_p < 1.0:
+            order = np.argsort(probs)[::-1]
+            keep = np.searchsorted(np.cumsum(probs[order]), seq.top_p) + 1
+            order = order[:keep]
+            return int(seq.rng.choice(order, p=probs[order] / probs[order].sum()))
+        return int(seq.rng.choice(self.n_vocab, p=probs))
+
+    def _finish(self, seq: _Sequence, text: str):
+        self._release(seq)
+        now = time.perf_counter()
+        first_token_at = seq.first_token_at or now
+        # Per-stage timings for telemetry, read by callers after result().
+        seq.future.timings = {
+            "queue": seq.admitted_at - seq.submitted_at,
+            "prompt_eval": first_token_at - seq.admitted_at,
+            "generate": now - first_token_at
+        }
+        if seq.future.set_running_or_notify_cancel():
+            seq.future.set_result(text)
+
+    def _step(self):
+        to_sample = self._fill_batch()
+        if self.batch.n_tokens == 0:
+            return
+
+        if llama_cpp.llama_decode(self.ctx, self.batch) != 0:
+            # KV cache could not fit the batch: fail the affected requests.
+            for seq in list(self.active.values()):
+                self._release(seq)
+                if seq.future.set_running_or_notify_cancel():
+                    seq.future.set_exception(RuntimeError("llama_decode failed"))
+            return
+
+        for batch_index, seq in to_sample:
+            if seq.first_token_at is None:
+                seq.first_token_at = time.perf_counter()
+            token = self._sample(seq, batch_index)
+            if token == self.eos_token:
+                self._finish(seq, seq.text)
+                continue
+            if seq.grammar is not None:
+                llama_cpp.llama_grammar_accept_token(self.ctx, seq.grammar.grammar, token)
+
+            seq.generated.append(token)
+            self.generated_tokens += 1
+            seq.text = self.model.detokenize(seq.generated).decode("utf-8", errors="ignore")
+
+            stop_at = min((seq.text.find(s) for s in seq.stop if s in seq.text), default=-1)
+            if stop_at >= 0:
+                self._finish(seq, seq.text[:stop_at])
+            elif len(seq.generated) >= seq.max_tokens:
+                self._finish(seq, seq.text)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._closed and not self.pending and not self.active:
+                    self._condition.wait()
+                if self._closed:
+                    break
+                self._admit()
+            try:
+                self._step()
+            except Exception as e:
+                self.logger.error(f"Batched decoding step failed: {e}")
+                for seq in list(self.active.values()):
+                    self._release(seq)
+                    if seq.future.set_running_or_notify_cancel():
+                        seq.future.set_exception(e)
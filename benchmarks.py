@@ -0,0 +1,629 @@
+"""Local performance benchmarks for the AI Research Assistant.
+
+Usage:
+    python benchmarks.py chunking [--file path/to/document.txt]
+    python benchmarks.py batching [--prompts 8] [--max-tokens 64]
+    python benchmarks.py pool [--max-workers 4] [--prompts 16] [--backend pool|fake]
+    python benchmarks.py speculative [--qa-file qa.jsonl] [--draft-model tiny.gguf]
+    python benchmarks.py startup [--runs 3]
+    python benchmarks.py extraction --file paper.pdf
+    python benchmarks.py ingest-memory [--size-mb 200] [--file big.txt]
+    python benchmarks.py load [--sessions 8] [--requests 4] [--capacity 1]
+    python benchmarks.py query-overhead [--queries 200] [--distinct 40]
+    python benchmarks.py hnsw [--file corpus.txt] [--k 3] [--target-recall 0.95] [--write]
+    python benchmarks.py retrieval [--queries 100] [--k 3]
+"""
+import argparse
+import io
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from config.settings import CHUNK_SIZE, CHUNK_OVERLAP, EMBEDDING_MAX_TOKENS, LLM_POOL_WORKERS, LLM_THREADS
+
+
+SAMPLE_PARAGRAPH = (
+    "Retrieval-augmented generation grounds a language model in external documents. "
+    "The retriever selects passages by embedding similarity, and the generator conditions on them. "
+    "Chunk boundaries matter because an embedding model only reads a fixed number of tokens. "
+    "Anything beyond that window is silently dropped before the vector is computed.\n\n"
+)
+
+
+def _load_corpus(path: str = None, repeat: int = 2000) -> str:
+    """Load the benchmark corpus from a file or synthesize one."""
+    if path:
+        return Path(path).read_text(encoding="utf-8", errors="ignore")
+    return SAMPLE_PARAGRAPH * repeat
+
+
+def _timed(fn, *args, runs: int = 3):
+    """Return (best wall time, result) over several runs."""
+    best, result = float("inf"), None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def bench_chunking(args):
+    """Throughput and embed-time truncation rate: character splitter vs token chunker."""
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    from src.text_chunker import TokenTextChunker
+
+    text = _load_corpus(args.file)
+    size_mb = len(text.encode("utf-8")) / (1024 * 1024)
+
+    splitters = {
+        "RecursiveCharacterTextSplitter": RecursiveCharacterTextSplitter(
+            chunk_size=CHUNK_SIZE,
+            chunk_overlap=CHUNK_OVERLAP,
+            length_function=len,
+            separators=["\n\n", "\n", " ", ""]
+        ),
+        "TokenTextChunker": TokenTextChunker(),
+    }
+    counter = splitters["TokenTextChunker"]
+
+    print(f"Corpus: {size_mb:.2f} MB, embedder window: {EMBEDDING_MAX_TOKENS} tokens")
+    print(f"{'splitter':<32}{'MB/s':>10}{'chunks':>10}{'mean tok':>10}{'truncated':>12}")
+    for name, splitter in splitters.items():
+        elapsed, chunks = _timed(splitter.split_text, text, runs=args.runs)
+        # Token counts as the embedder sees them, including [CLS]/[SEP].
+        tokens = counter.count_tokens(chunks, add_special_tokens=True)
+        truncated = float(np.mean(tokens > EMBEDDING_MAX_TOKENS)) if len(tokens) else 0.0
+        print(f"{name:<32}{size_mb / elapsed:>10.2f}{len(chunks):>10}"
+              f"{tokens.mean():>10.1f}{truncated:>11.1%}")
+
+
+def bench_batching(args):
+    """Aggregate tokens/sec: serial prompts vs concurrent batched decoding."""
+    from helpers.batch_inference import InferenceScheduler
+
+    scheduler = InferenceScheduler()
+    prompts = [
+        f"Question {i}: explain in two sentences why chunk overlap matters for retrieval.\n"
+        for i in range(args.prompts)
+    ]
+    kwargs = {"max_tokens": args.max_tokens, "temperature": 0.0}
+
+    def serial():
+        for prompt in prompts:
+            scheduler.submit(prompt, **kwargs).result()
+
+    def concurrent():
+        for future in scheduler.map(prompts, **kwargs):
+            future.result()
+
+    print(f"{args.prompts} prompts, up to {args.max_tokens} tokens each, "
+          f"{scheduler.max_sequences} sequences per batch")
+    print(f"{'mode':<12}{'seconds':>10}{'tokens':>10}{'tok/s':>10}")
+    for name, fn in [("serial", serial), ("concurrent", concurrent)]:
+        before = scheduler.generated_tokens
+        elapsed, _ = _timed(fn, runs=1)
+        tokens = scheduler.generated_tokens - before
+        print(f"{name:<12}{elapsed:>10.2f}{tokens:>10}{tokens / elapsed:>10.1f}")
+
+    scheduler.shutdown()
+
+
+def bench_pool(args):
+    """Throughput scaling of the worker-process pool from 1 to N workers."""
+    from helpers.llm_backend import create_llm_backend
+
+    prompts = [
+        f"Question {i}: list three risks of storing documents unencrypted.\n"
+        for i in range(args.prompts)
+    ]
+    kwargs = {"max_tokens": args.max_tokens, "temperature": 0.0}
+
+    print(f"{args.prompts} prompts, up to {args.max_tokens} tokens each, {args.threads} threads per worker")
+    print(f"{'workers':<10}{'seconds':>10}{'tokens':>10}{'tok/s':>10}{'speedup':>10}")
+    baseline = None
+    for n_workers in range(1, args.max_workers + 1):
+        if args.backend == "fake":
+            backend = create_llm_backend("fake", token_latency=0.01, max_workers=n_workers)
+        else:
+            backend = create_llm_backend("pool", n_workers=n_workers, n_threads=args.threads)
+
+        def run():
+            for future in backend.map(prompts, **kwargs):
+                future.result()
+
+        elapsed, _ = _timed(run, runs=1)
+        rate = backend.generated_tokens / elapsed
+        baseline = baseline or rate
+        print(f"{n_workers:<10}{elapsed:>10.2f}{backend.generated_tokens:>10}"
+              f"{rate:>10.1f}{rate / baseline:>9.2f}x")
+        backend.shutdown()
+
+
+def _load_qa_set(path: str = None) -> list:
+    """Load (context, question) pairs from JSONL or build a small synthetic set."""
+    if path:
+        with open(path, encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+    context = SAMPLE_PARAGRAPH * 3
+    questions = [
+        "What does the retriever select passages by?",
+        "Why do chunk boundaries matter?",
+        "What happens to text beyond the embedding window?",
+    ]
+    return [{"context": context, "question": q} for q in questions]
+
+
+def bench_speculative(args):
+    """Tokens/sec of greedy QA decoding: standard vs prompt lookup vs draft model."""
+    from config.prompts import QA_PROMPT_TEMPLATE
+    from helpers.speculative_decoding import SpeculativeDecoder, PromptLookupProposer, DraftModelProposer
+
+    qa_set = _load_qa_set(args.qa_file)
+    prompts = [QA_PROMPT_TEMPLATE.format(context=item["context"], question=item["question"])
+               for item in qa_set]
+    decoder = SpeculativeDecoder()
+
+    proposers = {"standard": None, "prompt_lookup": PromptLookupProposer()}
+    if args.draft_model:
+        proposers["draft_model"] = DraftModelProposer(args.draft_model)
+
+    print(f"{len(prompts)} QA prompts, up to {args.max_tokens} tokens each")
+    print(f"{'mode':<16}{'tok/s':>10}{'passes':>10}{'accepted':>10}{'exact':>8}")
+    reference = None
+    for name, proposer in proposers.items():
+        decoder.proposer = proposer
+        decoder.forward_passes = decoder.accepted_draft_tokens = 0
+        start = time.perf_counter()
+        outputs = [decoder.generate(prompt, max_tokens=args.max_tokens) for prompt in prompts]
+        elapsed = time.perf_counter() - start
+
+        n_tokens = sum(len(out) for out in outputs)
+        reference = reference or outputs
+        exact = sum(out == ref for out, ref in zip(outputs, reference))
+        print(f"{name:<16}{n_tokens / elapsed:>10.1f}{decoder.forward_passes:>10}"
+              f"{decoder.accepted_draft_tokens:>10}{exact:>5}/{len(prompts)}")
+
+
+# Runs in a fresh interpreter so every import is cold.
+_STARTUP_SCRIPT = """
+import json, time
+start = time.perf_counter()
+import app
+assistant = app.AIResearchAssistant()
+assistant.render_header()
+assistant.render_sidebar()
+first_render = time.perf_counter() - start
+assistant.langchain_helper.generate("qa", "Question: What is two plus two?\\nAnswer:")
+first_answer = time.perf_counter() - start
+print(json.dumps({"first_render": first_render, "first_answer": first_answer,
+                  "warmup": assistant.warmup.timings}))
+"""
+
+
+def _parse_importtime(stderr: str) -> list:
+    """Return (cumulative seconds, module) for top-level imports from -X importtime output."""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not name.startswith(" ") or name.startswith("  "):
+            continue  # nested import, already counted in its parent
+        imports.append((int(cumulative) / 1e6, name.strip()))
+    return imports
+
+
+def bench_startup(args):
+    """Cold-start time to first render and to first answer, with -X importtime breakdown."""
+    results = []
+    for _ in range(args.runs):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", _STARTUP_SCRIPT],
+            capture_output=True, text=True, cwd=Path(__file__).parent
+        )
+        if proc.returncode != 0:
+            print(proc.stderr[-2000:])
+            raise SystemExit("Startup benchmark failed.")
+        results.append((json.loads(proc.stdout.strip().splitlines()[-1]), _parse_importtime(proc.stderr)))
+
+    first_render = sorted(r["first_render"] for r, _ in results)
+    first_answer = sorted(r["first_answer"] for r, _ in results)
+    print(f"time-to-first-render: median {first_render[len(first_render) // 2]:.2f}s "
+          f"(min {first_render[0]:.2f}s)")
+    print(f"time-to-first-answer: median {first_answer[len(first_answer) // 2]:.2f}s "
+          f"(min {first_answer[0]:.2f}s)")
+    print(f"warm-up steps (last run): {results[-1][0]['warmup']}")
+
+    print("\nSlowest top-level imports (last run):")
+    for seconds, name in sorted(results[-1][1], reverse=True)[:args.top]:
+        print(f"{seconds:>8.3f}s  {name}")
+
+
+class _Upload(io.BytesIO):
+    """Minimal stand-in for Streamlit's UploadedFile."""
+
+    def __init__(self, path: str):
+        data = Path(path).read_bytes()
+        super().__init__(data)
+        self.name = Path(path).name
+        self.size = len(data)
+
+
+def bench_extraction(args):
+    """First upload (parse) vs re-upload (hash + cache read) of one document."""
+    from src.document_processor import DocumentProcessor
+    from src.extraction_cache import ExtractionCache
+    from helpers.telemetry import get_telemetry
+
+    upload = _Upload(args.file)
+    file_type = upload.name.rsplit(".", 1)[-1].lower()
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        # Skip __init__ so the benchmark does not load any models.
+        processor = DocumentProcessor.__new__(DocumentProcessor)
+        processor.telemetry = get_telemetry()
+        processor.extraction_cache = ExtractionCache(cache_dir)
+
+        first, text = _timed(processor.extract_text, upload, file_type, runs=1)
+        hash_time, content_hash = _timed(ExtractionCache.hash_file, upload, runs=args.runs)
+        key = ExtractionCache.key(content_hash, file_type)
+        read_time, _ = _timed(processor.extraction_cache.get, key, runs=args.runs)
+        again, cached = _timed(processor.extract_text, upload, file_type, runs=args.runs)
+
+    assert cached == text, "cached text differs from parsed text"
+    print(f"{upload.name}: {upload.size / 1024 / 1024:.2f} MB, {len(text):,} chars extracted")
+    print(f"{'first upload (hash + parse + store)':<40}{first * 1000:>10.1f} ms")
+    print(f"{'re-upload total':<40}{again * 1000:>10.1f} ms")
+    print(f"{'  of which hashing':<40}{hash_time * 1000:>10.1f} ms ({hash_time / again:.0%})")
+    print(f"{'  of which cache read + decompress':<40}{read_time * 1000:>10.1f} ms ({read_time / again:.0%})")
+    print(f"speedup: {first / again:.1f}x")
+
+
+# Runs in a fresh interpreter so ru_maxrss only reflects one extraction.
+_MEMORY_SCRIPT = """
+import io, json, resource, sys
+from pathlib import Path
+
+path, variant = sys.argv[1], sys.argv[2]
+upload = io.BytesIO(Path(path).read_bytes())  # the upload is already held in memory
+upload.name, upload.size = Path(path).name, upload.getbuffer().nbytes
+before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+if variant == "full-read":
+    content = upload.read()
+    text = content.decode("utf-8").strip()
+else:
+    from src.document_processor import DocumentProcessor
+    processor = DocumentProcessor.__new__(DocumentProcessor)  # no models needed
+    text = processor.extract_text_from_txt(upload)
+
+after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({"before_kb": before, "after_kb": after, "chars": len(text)}))
+"""
+
+
+def bench_ingest_memory(args):
+    """Peak RSS while extracting a large TXT upload: full read vs bounded streaming."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = args.file
+        if not path:
+            path = str(Path(tmp_dir) / "large.txt")
+            block = SAMPLE_PARAGRAPH.encode("utf-8")
+            with open(path, "wb") as f:
+                for _ in range(args.size_mb * 1024 * 1024 // len(block)):
+                    f.write(block)
+        size_mb = Path(path).stat().st_size / 1024 / 1024
+
+        print(f"{Path(path).name}: {size_mb:.0f} MB")
+        print(f"{'variant':<14}{'upload MB':>12}{'peak MB':>12}{'extra MB':>12}{'chars':>14}")
+        for variant in ["full-read", "streaming"]:
+            proc = subprocess.run(
+                [sys.executable, "-c", _MEMORY_SCRIPT, path, variant],
+                capture_output=True, text=True, cwd=Path(__file__).parent
+            )
+            if proc.returncode != 0:
+                print(proc.stderr[-2000:])
+                raise SystemExit(f"{variant} run failed.")
+            result = json.loads(proc.stdout.strip().splitlines()[-1])
+            before, after = result["before_kb"] / 1024, result["after_kb"] / 1024
+            print(f"{variant:<14}{before:>12.0f}{after:>12.0f}{after - before:>12.0f}{result['chars']:>14,}")
+
+
+def bench_load(args):
+    """Latency of N concurrent sessions on a stub LLM: plain FIFO vs the admission queue.
+
+    Even sessions upload a document and queue all their summaries at once;
+    odd sessions ask questions one after another. Both modes run at most
+    ``--capacity`` requests at a time, so the difference is queue order only.
+    """
+    import threading
+    from helpers.admission import AdmissionBackend, set_session
+    from helpers.llm_backend import create_llm_backend
+
+    def run(backend):
+        latencies = {"qa": [], "summary": []}
+        per_session, errors = {"qa": [], "summary": []}, []
+        lock = threading.Lock()
+        barrier = threading.Barrier(args.sessions)
+
+        def session(i: int):
+            session_id = f"session-{i}"
+            set_session(session_id)
+            task = "summary" if i % 2 == 0 else "qa"
+            timings = []
+            barrier.wait()
+            try:
+                if task == "summary":
+                    start = time.perf_counter()
+                    prompts = [f"{session_id} summary {j}" for j in range(args.requests)]
+                    for future in backend.map(prompts, task=task, max_tokens=args.max_tokens):
+                        backend.wait(future)
+                        timings.append(time.perf_counter() - start)
+                else:
+                    for j in range(args.requests):
+                        start = time.perf_counter()
+                        backend.wait(backend.submit(f"{session_id} question {j}", task=task,
+                                                    max_tokens=args.max_tokens))
+                        timings.append(time.perf_counter() - start)
+            except Exception as e:
+                errors.append(e)
+            with lock:
+                latencies[task] += timings
+                if timings:
+                    per_session[task].append(float(np.mean(timings)))
+
+        threads = [threading.Thread(target=session, args=(i,)) for i in range(args.sessions)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        backend.shutdown()
+        return latencies, per_session, len(errors), elapsed
+
+    print(f"{args.sessions} sessions x {args.requests} requests, capacity {args.capacity}, "
+          f"{args.token_latency * 1000:.0f} ms/token stub")
+    print(f"{'mode':<11}{'qa p50':>9}{'qa p95':>9}{'sum p50':>9}{'sum p95':>9}"
+          f"{'sum spread':>12}{'errors':>8}{'total s':>9}")
+    modes = {
+        "fifo": lambda: create_llm_backend("fake", token_latency=args.token_latency,
+                                           max_workers=args.capacity),
+        "admission": lambda: AdmissionBackend(create_llm_backend(
+            "fake", token_latency=args.token_latency, max_workers=args.capacity)),
+    }
+    for name, make_backend in modes.items():
+        latencies, per_session, errors, elapsed = run(make_backend())
+        qa, summary = np.array(latencies["qa"]), np.array(latencies["summary"])
+        # Fairness between uploads: slowest vs fastest session's mean summary latency.
+        uploads = per_session["summary"]
+        spread = max(uploads) / min(uploads) if uploads else float("nan")
+        print(f"{name:<11}{np.percentile(qa, 50):>9.2f}{np.percentile(qa, 95):>9.2f}"
+              f"{np.percentile(summary, 50):>9.2f}{np.percentile(summary, 95):>9.2f}"
+              f"{spread:>11.1f}x{errors:>8}{elapsed:>9.2f}")
+
+
+def bench_query_overhead(args):
+    """Per-query overhead before the LLM call: query embedding and prompt building."""
+    import random
+    from langchain.prompts import PromptTemplate
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+    from config.prompts import QA_PROMPT_TEMPLATE
+    from config.settings import EMBEDDING_MODEL, GENERATION_PROFILES
+    from helpers.embedding_cache import CachedQueryEmbeddings
+    from helpers.prompt_pipeline import CompiledPrompt
+
+    # A query stream where users repeat and re-ask questions
+    rng = random.Random(0)
+    distinct = [f"What does section {i} say about chunk boundaries?" for i in range(args.distinct)]
+    queries = [rng.choice(distinct) for _ in range(args.queries)]
+    context = SAMPLE_PARAGRAPH * 6
+
+    def build_before():
+        for query in queries:
+            PromptTemplate(template=QA_PROMPT_TEMPLATE, input_variables=["context", "question"]).format(
+                context=context, question=query)
+
+    compiled = CompiledPrompt(QA_PROMPT_TEMPLATE, lambda text: len(text.split()))
+    max_new_tokens = GENERATION_PROFILES["qa"]["max_tokens"]
+
+    def build_after():
+        for query in queries:
+            compiled.fits(max_new_tokens, context=context, question=query)
+            compiled.format(context=context, question=query)
+
+    embeddings = HuggingFaceEmbeddings(
+        model_name=EMBEDDING_MODEL,
+        model_kwargs={'device': 'cpu'},
+        encode_kwargs={'normalize_embeddings': True}
+    )
+    cached = CachedQueryEmbeddings(embeddings)
+    embeddings.embed_query("warm-up")
+
+    def embed_before():
+        for query in queries:
+            embeddings.embed_query(query)
+
+    def embed_after():
+        cached.clear()
+        for query in queries:
+            cached.embed_query(query)
+
+    results = {}
+    for name, fn in [("embed_before", embed_before), ("embed_after", embed_after),
+                     ("prompt_before", build_before), ("prompt_after", build_after)]:
+        elapsed, _ = _timed(fn, runs=args.runs)
+        results[name] = elapsed / len(queries) * 1000
+
+    hit_rate = cached.hits / max(1, cached.hits + cached.misses)
+    print(f"{len(queries)} queries, {args.distinct} distinct, query cache hit rate {hit_rate:.0%}")
+    print(f"{'stage':<16}{'before ms':>12}{'after ms':>12}{'speedup':>10}")
+    for stage in ["embed", "prompt"]:
+        before, after = results[f"{stage}_before"], results[f"{stage}_after"]
+        print(f"{stage:<16}{before:>12.3f}{after:>12.3f}{before / after:>9.1f}x")
+    before = results["embed_before"] + results["prompt_before"]
+    after = results["embed_after"] + results["prompt_after"]
+    print(f"{'total':<16}{before:>12.3f}{after:>12.3f}{before / after:>9.1f}x")
+
+
+def bench_hnsw(args):
+    """Sweep HNSW parameters: recall@k vs p95 latency frontier, optionally saving the pick."""
+    from src.hnsw_tuner import (
+        HNSWTuner, chunk_queries, choose_config, load_collection, pareto_frontier, write_config
+    )
+    from helpers.embedding_cache import get_embeddings
+    from config.settings import HNSW_CONFIG_FILE
+
+    embeddings = get_embeddings().embeddings  # bypass the query cache
+    if args.file:
+        from src.text_chunker import TokenTextChunker
+
+        chunks = TokenTextChunker().split_text(_load_corpus(args.file))
+        vectors = np.asarray(embeddings.embed_documents(chunks), dtype=np.float32)
+    else:
+        vectors, chunks = load_collection()
+    if len(chunks) < 2 * args.k:
+        raise SystemExit(f"Need at least {2 * args.k} chunks to tune; found {len(chunks)}.")
+
+    held_out, queries = chunk_queries(chunks, args.queries)
+    corpus = np.delete(vectors, held_out, axis=0)
+    query_vectors = np.asarray(embeddings.embed_documents(queries), dtype=np.float32)
+
+    tuner = HNSWTuner(corpus, query_vectors, k=args.k, space=args.space)
+    results = tuner.sweep(args.m, args.construction_ef, args.search_ef)
+    frontier = pareto_frontier(results)
+    chosen = choose_config(results, args.target_recall)
+
+    print(f"{len(corpus)} chunks indexed, {len(queries)} held-out queries, space={args.space}, k={tuner.k}")
+    print(f"{'M':>4}{'build ef':>10}{'search ef':>11}{'build s':>9}{'recall':>9}{'p50 ms':>9}{'p95 ms':>9}")
+    for result in results:
+        mark = " *" if result is chosen else (" frontier" if result in frontier else "")
+        print(f"{result['hnsw:M']:>4}{result['hnsw:construction_ef']:>10}{result['hnsw:search_ef']:>11}"
+              f"{result['build_s']:>9.2f}{result['recall']:>9.3f}{result['p50_ms']:>9.3f}"
+              f"{result['p95_ms']:>9.3f}{mark}")
+    print(f"chosen (* = fastest with recall@{tuner.k} >= {args.target_recall}): "
+          f"{ {k: v for k, v in chosen.items() if k.startswith('hnsw:')} }")
+
+    if args.write:
+        write_config(chosen)
+        print(f"Saved to {HNSW_CONFIG_FILE}; used for newly created collections.")
+
+
+def bench_retrieval(args):
+    """Per-query latency and duplicate context text: similarity top-k vs MMR with merged spans."""
+    from src.hnsw_tuner import chunk_queries, load_collection
+    from src.vector_store import duplicate_chars, get_vector_store
+
+    store = get_vector_store()
+    _, chunks = load_collection(store)
+    if not chunks:
+        raise SystemExit("The vector store is empty; process a document in the app first.")
+    _, queries = chunk_queries(chunks, args.queries)
+    for query in queries:
+        store.embeddings.embed_query(query)  # both modes then hit the query cache
+
+    print(f"{len(chunks)} chunks, {len(queries)} chunk-derived queries, k={args.k}")
+    print(f"{'mode':<12}{'p50 ms':>9}{'p95 ms':>9}{'results':>9}{'context chars':>15}{'dup chars':>11}")
+    duplicates = {}
+    for mode in ["similarity", "mmr"]:
+        latencies, results, context, dup = [], 0, 0, 0
+        for query in queries:
+            start = time.perf_counter()
+            docs = store.search_documents(query, k=args.k, mode=mode)
+            latencies.append(time.perf_counter() - start)
+            texts = [doc.page_content for doc in docs]
+            results += len(docs)
+            context += sum(map(len, texts))
+            dup += duplicate_chars(texts)
+        n = len(queries)
+        duplicates[mode] = dup / n
+        print(f"{mode:<12}{np.percentile(latencies, 50) * 1000:>9.2f}{np.percentile(latencies, 95) * 1000:>9.2f}"
+              f"{results / n:>9.1f}{context / n:>15.0f}{dup / n:>11.0f}")
+    print(f"duplicate text removed per query: {duplicates['similarity'] - duplicates['mmr']:.0f} chars")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    chunking = subparsers.add_parser("chunking", help=bench_chunking.__doc__)
+    chunking.add_argument("--file", help="Text file to chunk (defaults to a synthetic corpus)")
+    chunking.add_argument("--runs", type=int, default=3)
+    chunking.set_defaults(func=bench_chunking)
+
+    batching = subparsers.add_parser("batching", help=bench_batching.__doc__)
+    batching.add_argument("--prompts", type=int, default=8)
+    batching.add_argument("--max-tokens", type=int, default=64)
+    batching.set_defaults(func=bench_batching)
+
+    pool = subparsers.add_parser("pool", help=bench_pool.__doc__)
+    pool.add_argument("--max-workers", type=int, default=LLM_POOL_WORKERS)
+    pool.add_argument("--threads", type=int, default=LLM_THREADS)
+    pool.add_argument("--prompts", type=int, default=16)
+    pool.add_argument("--max-tokens", type=int, default=64)
+    pool.add_argument("--backend", choices=["pool", "fake"], default="pool")
+    pool.set_defaults(func=bench_pool)
+
+    speculative = subparsers.add_parser("speculative", help=bench_speculative.__doc__)
+    speculative.add_argument("--qa-file", help="JSONL with 'context' and 'question' fields")
+    speculative.add_argument("--draft-model", help="Optional draft GGUF sharing the main vocabulary")
+    speculative.add_argument("--max-tokens", type=int, default=128)
+    speculative.set_defaults(func=bench_speculative)
+
+    startup = subparsers.add_parser("startup", help=bench_startup.__doc__)
+    startup.add_argument("--runs", type=int, default=3)
+    startup.add_argument("--top", type=int, default=15)
+    startup.set_defaults(func=bench_startup)
+
+    extraction = subparsers.add_parser("extraction", help=bench_extraction.__doc__)
+    extraction.add_argument("--file", required=True, help="PDF, DOCX or TXT document")
+    extraction.add_argument("--runs", type=int, default=5)
+    extraction.set_defaults(func=bench_extraction)
+
+    ingest_memory = subparsers.add_parser("ingest-memory", help=bench_ingest_memory.__doc__)
+    ingest_memory.add_argument("--file", help="TXT file to ingest (defaults to a synthetic file)")
+    ingest_memory.add_argument("--size-mb", type=int, default=200)
+    ingest_memory.set_defaults(func=bench_ingest_memory)
+
+    load = subparsers.add_parser("load", help=bench_load.__doc__)
+    load.add_argument("--sessions", type=int, default=8)
+    load.add_argument("--requests", type=int, default=4)
+    load.add_argument("--capacity", type=int, default=1)
+    load.add_argument("--max-tokens", type=int, default=8)
+    load.add_argument("--token-latency", type=float, default=0.01)
+    load.set_defaults(func=bench_load)
+
+    query_overhead = subparsers.add_parser("query-overhead", help=bench_query_overhead.__doc__)
+    query_overhead.add_argument("--queries", type=int, default=200)
+    query_overhead.add_argument("--distinct", type=int, default=40)
+    query_overhead.add_argument("--runs", type=int, default=3)
+    query_overhead.set_defaults(func=bench_query_overhead)
+
+    hnsw = subparsers.add_parser("hnsw", help=bench_hnsw.__doc__)
+    hnsw.add_argument("--file", help="Text file to chunk and embed (defaults to the stored collection)")
+    hnsw.add_argument("--queries", type=int, default=200)
+    hnsw.add_argument("--k", type=int, default=3)
+    hnsw.add_argument("--space", choices=["cosine", "l2", "ip"], default="cosine")
+    hnsw.add_argument("--m", type=int, nargs="+", default=[8, 16, 32])
+    hnsw.add_argument("--construction-ef", type=int, nargs="+", default=[64, 100, 200])
+    hnsw.add_argument("--search-ef", type=int, nargs="+", default=[10, 20, 40, 80, 160])
+    hnsw.add_argument("--target-recall", type=float, default=0.95)
+    hnsw.add_argument("--write", action="store_true", help="Save the chosen parameters for new collections")
+    hnsw.set_defaults(func=bench_hnsw)
+
+    retrieval = subparsers.add_parser("retrieval", help=bench_retrieval.__doc__)
+    retrieval.add_argument("--queries", type=int, default=100)
+    retrieval.add_argument("--k", type=int, default=3)
+    retrieval.set_defaults(func=bench_retrieval)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
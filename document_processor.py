@@ -1,22 +1,61 @@
 import streamlit as st
-import PyPDF2
-import pdfplumber
-from docx import Document as DocxDocument
-from typing import Dict, Any
-import tempfile
+import codecs
 import os
-from helpers.langchain_helper import LangChainHelper
+from functools import lru_cache
+from typing import Dict, Any, Optional
+from helpers.langchain_helper import get_langchain_helper
+from helpers.telemetry import get_telemetry
+from src.extraction_cache import ExtractionCache
 from config.settings import SUPPORTED_FORMATS, MAX_FILE_SIZE  # ADD THIS LINE
+from config.settings import EXTRACTION_BLOCK_SIZE, ENCODING_SAMPLE_BYTES, MAX_EXTRACTED_CHARS
 
 # Rest of the class remains the same...
 
 
 
+class _BoundedText:
+    """Collects extracted text pieces up to a hard character ceiling."""
+
+    def __init__(self, max_chars: int = MAX_EXTRACTED_CHARS):
+        self.pieces = []
+        self.length = 0
+        self.max_chars = max_chars
+        self.truncated = False
+
+    def append(self, piece: str) -> bool:
+        """Add a piece; return False once the ceiling has been reached."""
+        room = self.max_chars - self.length
+        if len(piece) > room:
+            piece = piece[:room]
+            self.truncated = True
+        if piece:
+            self.pieces.append(piece)
+            self.length += len(piece)
+        return not self.truncated
+
+    def getvalue(self) -> str:
+        """Join the pieces once, stripping only the outer pieces to avoid another full copy."""
+        pieces = self.pieces
+        while pieces and not pieces[0].strip():
+            pieces.pop(0)
+        while pieces and not pieces[-1].strip():
+            pieces.pop()
+        if not pieces:
+            return ""
+        pieces[0] = pieces[0].lstrip()
+        pieces[-1] = pieces[-1].rstrip()
+        text = "".join(pieces)
+        self.pieces = []
+        return text
+
+
 class DocumentProcessor:
     """Advanced document processing with multiple format support."""
 
     def __init__(self):
-        self.langchain_helper = LangChainHelper()
+        self.langchain_helper = get_langchain_helper()
+        self.telemetry = get_telemetry()
+        self.extraction_cache = ExtractionCache()
         self.supported_formats = SUPPORTED_FORMATS
         self.max_file_size = MAX_FILE_SIZE * 1024 * 1024  # Convert to bytes
 
@@ -32,8 +71,8 @@ class DocumentProcessor:
             validation_result["message"] = "No file uploaded."
             return validation_result
 
-        # Check file size
-        if uploaded_file.size > self.max_file_size:
+        # Check file size: reject on the declared size first, then on the real payload size
+        if uploaded_file.size > self.max_file_size or self._payload_size(uploaded_file) > self.max_file_size:
             validation_result["message"] = f"File size exceeds {MAX_FILE_SIZE}MB limit."
             return validation_result
 
@@ -55,33 +94,53 @@ class DocumentProcessor:
 
         return validation_result
 
+    def _payload_size(self, uploaded_file) -> int:
+        """Actual size of the upload stream, measured by seeking rather than trusting ``size``."""
+        position = uploaded_file.tell()
+        size = uploaded_file.seek(0, os.SEEK_END)
+        uploaded_file.seek(position)
+        return size
+
+    def _warn_if_truncated(self, text: _BoundedText):
+        if text.truncated:
+            st.warning(f"Document text truncated to the first {text.max_chars:,} characters.")
+
     def extract_text_from_pdf(self, uploaded_file) -> str:
         """Extract text from PDF using multiple methods for robustness."""
-        text = ""
+        import PyPDF2
+        import pdfplumber
+
+        text = _BoundedText()
 
         try:
             # Method 1: pdfplumber (preferred for complex layouts)
+            uploaded_file.seek(0)
             with pdfplumber.open(uploaded_file) as pdf:
                 for page_num, page in enumerate(pdf.pages):
                     try:
                         page_text = page.extract_text()
                         if page_text:
-                            text += f"\n\n--- Page {page_num + 1} ---\n\n"
-                            text += page_text
+                            text.append(f"\n\n--- Page {page_num + 1} ---\n\n")
+                            if not text.append(page_text):
+                                break
                     except Exception as e:
                         st.warning(f"Could not extract text from page {page_num + 1}: {e}")
                         continue
+                    finally:
+                        page.flush_cache()  # release parsed layout objects page by page
 
             # If pdfplumber fails, fallback to PyPDF2
-            if not text.strip():
+            if not text.length:
+                text = _BoundedText()
                 uploaded_file.seek(0)  # Reset file pointer
                 pdf_reader = PyPDF2.PdfReader(uploaded_file)
                 for page_num, page in enumerate(pdf_reader.pages):
                     try:
                         page_text = page.extract_text()
                         if page_text:
-                            text += f"\n\n--- Page {page_num + 1} ---\n\n"
-                            text += page_text
+                            text.append(f"\n\n--- Page {page_num + 1} ---\n\n")
+                            if not text.append(page_text):
+                                break
                     except Exception as e:
                         st.warning(f"Fallback extraction failed for page {page_num + 1}: {e}")
                         continue
@@ -90,28 +149,25 @@ class DocumentProcessor:
             st.error(f"PDF extraction failed: {e}")
             return ""
 
-        return text.strip()
+        self._warn_if_truncated(text)
+        return text.getvalue()
 
     def extract_text_from_docx(self, uploaded_file) -> str:
         """Extract text from DOCX files."""
-        try:
-            # Save uploaded file temporarily
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.docx') as tmp_file:
-                tmp_file.write(uploaded_file.read())
-                tmp_file_path = tmp_file.name
+        from docx import Document as DocxDocument
 
-            # Extract text using python-docx
-            doc = DocxDocument(tmp_file_path)
-            text = ""
+        try:
+            # Parse straight from the in-memory upload buffer (no temp file)
+            uploaded_file.seek(0)
+            doc = DocxDocument(uploaded_file)
 
+            text = _BoundedText()
             for paragraph in doc.paragraphs:
-                if paragraph.text.strip():
-                    text += paragraph.text + "\n"
-
-            # Clean up temporary file
-            os.unlink(tmp_file_path)
+                if paragraph.text.strip() and not text.append(paragraph.text + "\n"):
+                    break
 
-            return text.strip()
+            self._warn_if_truncated(text)
+            return text.getvalue()
 
         except Exception as e:
             st.error(f"DOCX extraction failed: {e}")
@@ -120,30 +176,68 @@ class DocumentProcessor:
     def extract_text_from_txt(self, uploaded_file) -> str:
         """Extract text from TXT files with encoding detection."""
         try:
-            # Try UTF-8 first
+            # Detect the encoding on a sample: UTF-8 if it decodes, else Latin-1 (never fails)
             uploaded_file.seek(0)
-            content = uploaded_file.read()
-
+            sample = uploaded_file.read(ENCODING_SAMPLE_BYTES)
             try:
-                text = content.decode('utf-8')
+                codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+                encoding = 'utf-8'
             except UnicodeDecodeError:
-                # Fallback to other encodings
-                for encoding in ['latin1', 'cp1252', 'iso-8859-1']:
-                    try:
-                        text = content.decode(encoding)
-                        st.info(f"Text decoded using {encoding} encoding.")
-                        break
-                    except UnicodeDecodeError:
-                        continue
-                else:
-                    raise UnicodeDecodeError("Unable to decode file with any common encoding.")
+                encoding = 'latin1'
+                st.info(f"Text decoded using {encoding} encoding.")
 
-            return text.strip()
+            try:
+                return self._decode_stream(uploaded_file, encoding)
+            except UnicodeDecodeError:
+                # Invalid UTF-8 beyond the sample
+                st.info("Text decoded using latin1 encoding.")
+                return self._decode_stream(uploaded_file, 'latin1')
 
         except Exception as e:
             st.error(f"TXT extraction failed: {e}")
             return ""
 
+    def _decode_stream(self, uploaded_file, encoding: str) -> str:
+        """Decode the upload block by block, holding at most MAX_EXTRACTED_CHARS of text."""
+        uploaded_file.seek(0)
+        decoder = codecs.getincrementaldecoder(encoding)()
+        text = _BoundedText()
+        for block in iter(lambda: uploaded_file.read(EXTRACTION_BLOCK_SIZE), b""):
+            if not text.append(decoder.decode(block)):
+                break
+        else:
+            text.append(decoder.decode(b"", final=True))
+
+        self._warn_if_truncated(text)
+        return text.getvalue()
+
+    def extract_text(self, uploaded_file, file_type: str, content_hash: Optional[str] = None) -> str:
+        """Extract text, reusing the cached result for previously seen content."""
+        if content_hash is None:
+            with self.telemetry.span("hash"):
+                content_hash = self.extraction_cache.hash_file(uploaded_file)
+        cache_key = self.extraction_cache.key(content_hash, file_type)
+
+        text = self.extraction_cache.get(cache_key)
+        if text is not None:
+            self.telemetry.incr("cache_hits_total", cache="extraction")
+            return text
+        self.telemetry.incr("cache_misses_total", cache="extraction")
+
+        # Extract text based on file type
+        text = ""
+        with self.telemetry.span("extract", file_type=file_type):
+            if file_type == "pdf":
+                text = self.extract_text_from_pdf(uploaded_file)
+            elif file_type == "docx":
+                text = self.extract_text_from_docx(uploaded_file)
+            elif file_type == "txt":
+                text = self.extract_text_from_txt(uploaded_file)
+
+        if text.strip():
+            self.extraction_cache.put(cache_key, text)
+        return text
+
     def process_document(self, uploaded_file) -> Dict[str, Any]:
         """Process uploaded document and return extracted content."""
         # Validate file
@@ -158,14 +252,9 @@ class DocumentProcessor:
         file_info = validation["file_info"]
         file_type = file_info["type"]
 
-        # Extract text based on file type
-        text = ""
-        if file_type == "pdf":
-            text = self.extract_text_from_pdf(uploaded_file)
-        elif file_type == "docx":
-            text = self.extract_text_from_docx(uploaded_file)
-        elif file_type == "txt":
-            text = self.extract_text_from_txt(uploaded_file)
+        with self.telemetry.span("hash"):
+            content_hash = self.extraction_cache.hash_file(uploaded_file)
+        text = self.extract_text(uploaded_file, file_type, content_hash)
 
         if not text.strip():
             return {
@@ -178,7 +267,11 @@ class DocumentProcessor:
         summary = self.langchain_helper.generate_summary(text)
 
         # Create document chunks
-        chunks = self.langchain_helper.text_splitter.split_text(text)
+        with self.telemetry.span("split"):
+            offsets = self.langchain_helper.text_splitter.split_spans(text)
+            chunks = [text[start:end] for start, end in offsets]
+        self.telemetry.incr("chunks_total", len(chunks))
+        self.telemetry.incr("documents_processed_total", file_type=file_type)
 
         # Create metadata
         metadata = {
@@ -187,7 +280,8 @@ class DocumentProcessor:
             "file_type": file_type,
             "total_chunks": len(chunks),
             "word_count": len(text.split()),
-            "char_count": len(text)
+            "char_count": len(text),
+            "content_hash": content_hash
         }
 
         return {
@@ -197,6 +291,13 @@ class DocumentProcessor:
                 "raw_text": text,
                 "summary": summary,
                 "chunks": chunks,
+                "chunk_offsets": offsets,
                 "metadata": metadata
             }
         }
+
+
+@lru_cache(maxsize=None)
+def get_document_processor() -> DocumentProcessor:
+    """Return the process-wide document processor shared by all sessions."""
+    return DocumentProcessor()
@@ -0,0 +1,68 @@
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+from config.settings import EMBEDDING_MODEL, QUERY_EMBEDDING_CACHE_SIZE
+from helpers.telemetry import get_telemetry
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """Embeddings wrapper with a bounded LRU cache in front of ``embed_query``.
+
+    Every similarity search embeds its query, and users often repeat or
+    re-ask questions; repeated queries skip the model entirely. Documents
+    are embedded once at ingest, so ``embed_documents`` is not cached.
+    """
+
+    def __init__(self, embeddings: Embeddings, max_entries: int = QUERY_EMBEDDING_CACHE_SIZE):
+        self.embeddings = embeddings
+        self.max_entries = max_entries
+        self.telemetry = get_telemetry()
+        self.hits = 0
+        self.misses = 0
+        self._cache: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        with self._lock:
+            vector = self._cache.get(text)
+            if vector is not None:
+                self._cache.move_to_end(text)
+                self.hits += 1
+            else:
+                self.misses += 1
+        if vector is not None:
+            self.telemetry.incr("cache_hits_total", cache="query_embedding")
+            return list(vector)
+
+        self.telemetry.incr("cache_misses_total", cache="query_embedding")
+        vector = self.embeddings.embed_query(text)
+        with self._lock:
+            # Stored as a tuple so callers can't mutate the cached vector.
+            self._cache[text] = tuple(vector)
+            self._cache.move_to_end(text)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return vector
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+
+@lru_cache(maxsize=None)
+def get_embeddings() -> CachedQueryEmbeddings:
+    """Return the process-wide embedding model shared by the vector store and the QA path."""
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+
+    return CachedQueryEmbeddings(HuggingFaceEmbeddings(
+        model_name=EMBEDDING_MODEL,
+        model_kwargs={'device': 'cpu'},
+        encode_kwargs={'normalize_embeddings': True}
+    ))
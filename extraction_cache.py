@@ -0,0 +1,101 @@
+import gzip
+import hashlib
+import logging
+import os
+import threading
+from typing import Optional
+
+from config.settings import EXTRACTION_CACHE_DIR, EXTRACTION_CACHE_MAX_MB
+
+
+# Bump an extractor's version whenever its output changes so stale entries are ignored.
+EXTRACTOR_VERSIONS = {
+    "pdf": 1,
+    "docx": 2,  # parsed from an in-memory buffer
+    "txt": 1,
+}
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+class ExtractionCache:
+    """On-disk cache of extracted document text keyed by content hash.
+
+    Entries are gzip-compressed text files named ``<sha256>-<type>-v<version>``.
+    Reads refresh an entry's modification time, and writes evict the least
+    recently used entries once the directory exceeds ``max_bytes``.
+    """
+
+    def __init__(self, directory=EXTRACTION_CACHE_DIR, max_bytes: int = EXTRACTION_CACHE_MAX_MB * 1024 * 1024):
+        self.logger = logging.getLogger(__name__)
+        self.directory = str(directory)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def hash_file(uploaded_file) -> str:
+        """SHA-256 of a file-like object, read in blocks; the position is reset afterwards."""
+        digest = hashlib.sha256()
+        uploaded_file.seek(0)
+        for block in iter(lambda: uploaded_file.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+        uploaded_file.seek(0)
+        return digest.hexdigest()
+
+    @staticmethod
+    def key(content_hash: str, file_type: str) -> str:
+        return f"{content_hash}-{file_type}-v{EXTRACTOR_VERSIONS[file_type]}"
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.txt.gz")
+
+    def get(self, key: str) -> Optional[str]:
+        """Return cached text or ``None``."""
+        path = self._path(key)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                text = f.read()
+            os.utime(path)  # mark as recently used
+            return text
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError) as e:
+            self.logger.warning(f"Dropping unreadable cache entry {key}: {e}")
+            self._remove(path)
+            return None
+
+    def put(self, key: str, text: str):
+        """Store text atomically, then evict old entries if over budget."""
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=6) as f:
+                f.write(text)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            self.logger.warning(f"Could not write cache entry {key}: {e}")
+            self._remove(tmp_path)
+            return
+        self._evict()
+
+    def _evict(self):
+        with self._lock:
+            entries = []
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith(".txt.gz"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                self._remove(path)
+                total -= size
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,143 @@
+import json
+import random
+import re
+import time
+from itertools import product
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config.settings import HNSW_CONFIG_FILE, ensure_data_dirs
+
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+def exact_neighbors(corpus: np.ndarray, queries: np.ndarray, k: int, space: str = "cosine") -> np.ndarray:
+    """Brute-force top-``k`` corpus rows for every query, nearest first."""
+    if space == "l2":
+        # ||q - x||^2 = ||q||^2 - 2 q.x + ||x||^2; the ||q||^2 term doesn't change the ranking
+        scores = 2 * queries @ corpus.T - np.einsum("ij,ij->i", corpus, corpus)[None, :]
+    else:
+        if space == "cosine":
+            corpus = corpus / np.linalg.norm(corpus, axis=1, keepdims=True)
+            queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+        scores = queries @ corpus.T
+    k = min(k, corpus.shape[0])
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.take_along_axis(scores, top, axis=1).argsort(axis=1)[:, ::-1]
+    return np.take_along_axis(top, order, axis=1)
+
+
+def recall_at_k(approx: np.ndarray, exact: np.ndarray) -> float:
+    """Mean fraction of the exact top-k found by the approximate search."""
+    hits = (approx[:, :, None] == exact[:, None, :]).any(axis=2).sum(axis=1)
+    return float(hits.mean() / exact.shape[1])
+
+
+def pareto_frontier(results: List[Dict]) -> List[Dict]:
+    """Configurations that no other configuration beats on both recall and p95 latency."""
+    frontier, best_recall = [], -1.0
+    for result in sorted(results, key=lambda r: (r["p95_ms"], -r["recall"])):
+        if result["recall"] > best_recall:
+            frontier.append(result)
+            best_recall = result["recall"]
+    return frontier
+
+
+def choose_config(results: List[Dict], target_recall: float) -> Dict:
+    """Fastest configuration (by p95) reaching ``target_recall``, else the most accurate one."""
+    good = [r for r in results if r["recall"] >= target_recall]
+    if good:
+        return min(good, key=lambda r: (r["p95_ms"], -r["recall"]))
+    return max(results, key=lambda r: (r["recall"], -r["p95_ms"]))
+
+
+def chunk_queries(chunks: Sequence[str], n_queries: int, seed: int = 0) -> Tuple[List[int], List[str]]:
+    """Pick ``n_queries`` held-out chunks and derive a query from each: its longest sentence.
+
+    Callers drop the held-out chunks from the corpus, so every query has to
+    find its neighbours among the other chunks, like a real question.
+    """
+    rng = random.Random(seed)
+    held_out = sorted(rng.sample(range(len(chunks)), min(n_queries, len(chunks) // 2)))
+    queries = [max(_SENTENCE_RE.split(chunks[i].strip()), key=len)[:300] for i in held_out]
+    return held_out, queries
+
+
+class HNSWTuner:
+    """Sweeps HNSW parameters against exact NumPy neighbours.
+
+    Indexes are built with ``hnswlib``, the library Chroma uses for its
+    HNSW segments, so ``M``, construction ef and search ef behave exactly as
+    the ``hnsw:*`` collection metadata would. Latency is measured per query
+    on one thread, like a single similarity search.
+    """
+
+    def __init__(self, corpus: np.ndarray, queries: np.ndarray, k: int = 3, space: str = "cosine"):
+        self.corpus = np.ascontiguousarray(corpus, dtype=np.float32)
+        self.queries = np.ascontiguousarray(queries, dtype=np.float32)
+        self.k = min(k, len(self.corpus))
+        self.space = space
+        self.exact = exact_neighbors(self.corpus, self.queries, self.k, space)
+
+    def _build(self, m: int, construction_ef: int):
+        import hnswlib
+
+        index = hnswlib.Index(space=self.space, dim=self.corpus.shape[1])
+        index.init_index(max_elements=len(self.corpus), ef_construction=construction_ef, M=m)
+        index.add_items(self.corpus, np.arange(len(self.corpus)))
+        index.set_num_threads(1)
+        return index
+
+    def evaluate(self, index, search_ef: int) -> Dict:
+        index.set_ef(max(search_ef, self.k))
+        labels = np.empty((len(self.queries), self.k), dtype=np.int64)
+        latencies = np.empty(len(self.queries))
+        for i, query in enumerate(self.queries):
+            start = time.perf_counter()
+            labels[i] = index.knn_query(query, k=self.k)[0][0]
+            latencies[i] = time.perf_counter() - start
+        return {
+            "recall": recall_at_k(labels, self.exact),
+            "p50_ms": float(np.percentile(latencies, 50) * 1000),
+            "p95_ms": float(np.percentile(latencies, 95) * 1000),
+        }
+
+    def sweep(self, m_values: Sequence[int], construction_ef_values: Sequence[int],
+              search_ef_values: Sequence[int]) -> List[Dict]:
+        """Evaluate every parameter combination; one index is built per (M, construction ef)."""
+        results = []
+        for m, construction_ef in product(m_values, construction_ef_values):
+            start = time.perf_counter()
+            index = self._build(m, construction_ef)
+            build_s = time.perf_counter() - start
+            for search_ef in search_ef_values:
+                results.append({
+                    "hnsw:space": self.space,
+                    "hnsw:M": m,
+                    "hnsw:construction_ef": construction_ef,
+                    "hnsw:search_ef": search_ef,
+                    "build_s": build_s,
+                    **self.evaluate(index, search_ef)
+                })
+        return results
+
+
+def write_config(result: Dict, path=HNSW_CONFIG_FILE) -> Dict:
+    """Save the ``hnsw:*`` parameters of a result; settings load them for new collections."""
+    params = {key: value for key, value in result.items() if key.startswith("hnsw:")}
+    ensure_data_dirs()
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(params, f, indent=2)
+    return params
+
+
+def load_collection(vector_store=None, limit: Optional[int] = None) -> Tuple[np.ndarray, List[str]]:
+    """Embeddings and chunk texts stored in the vector store's collection."""
+    if vector_store is None:
+        from src.vector_store import get_vector_store
+
+        vector_store = get_vector_store()
+    data = vector_store.vectorstore._collection.get(include=["embeddings", "documents"], limit=limit)
+    return np.asarray(data["embeddings"], dtype=np.float32), list(data["documents"])
@@ -1,17 +1,18 @@
-from langchain_community.llms import LlamaCpp
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.chains import RetrievalQA
-from langchain.prompts import PromptTemplate
-from typing import List, Dict
+from functools import lru_cache
+from typing import List, Dict, Any
+import json
 import logging
-from langchain_community.llms import LlamaCpp
-from config.prompts import (
-    SUMMARY_PROMPT_TEMPLATE, QA_PROMPT_TEMPLATE,
-    QUESTION_GENERATION_TEMPLATES, EVALUATION_PROMPT_TEMPLATE
-)
-from config.settings import AUTO_SUMMARY_MAX_WORDS, QUESTION_TYPES
-from config.settings import MODEL_PATH, MODEL_CONTEXT_LENGTH, MODEL_TEMPERATURE, MODEL_MAX_TOKENS, EMBEDDING_MODEL, CHUNK_SIZE, CHUNK_OVERLAP
+import re
+import time
+from config.prompts import OUTPUT_CONSTRAINTS
+from config.settings import AUTO_SUMMARY_MAX_WORDS, QUESTION_TYPES, GENERATION_PROFILES
+from config.settings import MODEL_TEMPERATURE, MODEL_MAX_TOKENS
+from helpers.embedding_cache import get_embeddings
+from helpers.llm_backend import BackendLLM, get_llm_backend, get_qa_backend, record_generation
+from helpers.prompt_pipeline import compile_prompts
+from helpers.telemetry import get_telemetry
+from helpers.profiler import profiled
+from src.text_chunker import TokenTextChunker
 
 
 
@@ -23,8 +24,11 @@ class LangChainHelper:
     def __init__(self):
         self.logger = self._setup_logging()
         self.llm = None
+        self.qa_llm = None
+        self.backend = None
         self.embeddings = None
         self.text_splitter = None
+        self.prompts = {}
         self._initialize_components()
 
     def _setup_logging(self) -> logging.Logger:
@@ -35,113 +39,179 @@ class LangChainHelper:
     def _initialize_components(self):
         """Initialize LangChain components."""
         try:
-            # Initialize LLaMA model
-            self.llm = LlamaCpp(
-                model_path=MODEL_PATH,
-                n_ctx=MODEL_CONTEXT_LENGTH,
-                n_batch=512,
-                n_threads=8,
-                f16_kv=True,
-                verbose=False,
+            # Initialize LLaMA model through the shared backend (see LLM_BACKEND)
+            self.backend = get_llm_backend()
+            self.llm = BackendLLM(
+                backend=self.backend,
                 temperature=MODEL_TEMPERATURE,
                 max_tokens=MODEL_MAX_TOKENS,
                 top_p=0.95,
                 repeat_penalty=1.1
             )
-
-            # Initialize embeddings
-            self.embeddings = HuggingFaceEmbeddings(
-                model_name=EMBEDDING_MODEL,
-                model_kwargs={'device': 'cpu'},
-                encode_kwargs={'normalize_embeddings': True}
+            # QA answers may use speculative decoding (see QA_DECODING_MODE)
+            qa_profile = GENERATION_PROFILES["qa"]
+            self.qa_llm = BackendLLM(
+                backend=get_qa_backend(),
+                task="qa",
+                max_tokens=qa_profile["max_tokens"],
+                temperature=qa_profile["temperature"],
+                stop=qa_profile["stop"],
+                top_p=0.95,
+                repeat_penalty=1.1
             )
 
-            # Initialize text splitter
-            self.text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=CHUNK_SIZE,
-                chunk_overlap=CHUNK_OVERLAP,
-                length_function=len,
-                separators=["\n\n", "\n", " ", ""]
+            # Compile prompt templates once (static token counts measured with the model tokenizer),
+            # budgeted against the smaller per-request context of the two backends
+            self.prompts = compile_prompts(
+                self.backend.count_tokens,
+                min(self.backend.context_length, self.qa_llm.backend.context_length)
             )
 
+            # Initialize embeddings (shared with the vector store, query embeddings cached)
+            self.embeddings = get_embeddings()
+
+            # Initialize token-aware text splitter
+            self.text_splitter = TokenTextChunker()
+
+            get_telemetry().register_gauge("llm_queue_depth", lambda: self.backend.queue_depth)
+
             self.logger.info("LangChain components initialized successfully")
 
         except Exception as e:
             self.logger.error(f"Failed to initialize LangChain components: {e}")
             raise
 
+    def _generation_kwargs(self, task: str) -> Dict[str, Any]:
+        """Backend arguments for a task: its profile limits plus any output constraint."""
+        return {
+            **GENERATION_PROFILES[task],
+            **OUTPUT_CONSTRAINTS.get(task, {}),
+            "top_p": 0.95,
+            "repeat_penalty": 1.1
+        }
+
+    @profiled("llm_generate", all_threads=True)
+    def generate(self, task: str, prompt: str) -> str:
+        """Generate text for one prompt using the task's generation profile."""
+        start = time.perf_counter()
+        future = self.backend.submit(prompt, task=task, **self._generation_kwargs(task))
+        text = self.backend.wait(future)
+        record_generation(task, self.backend, future, text,
+                          GENERATION_PROFILES[task]["max_tokens"], time.perf_counter() - start)
+        return text
+
+    @profiled("llm_generate_batch", all_threads=True)
+    def generate_batch(self, task: str, prompts: List[str]) -> List[str]:
+        """Generate completions for several prompts of one task concurrently.
+
+        How much actually runs in parallel depends on the backend: batched
+        decoding shares decode steps, the worker pool spreads prompts over
+        model replicas, and the single-model backend runs them in order.
+        """
+        start = time.perf_counter()
+        futures = self.backend.map(prompts, task=task, **self._generation_kwargs(task))
+        texts = []
+        try:
+            for future in futures:
+                texts.append(self.backend.wait(future))
+                record_generation(task, self.backend, future, texts[-1],
+                                  GENERATION_PROFILES[task]["max_tokens"], time.perf_counter() - start)
+        finally:
+            # Don't leave the rest of the batch queued if one request failed or timed out.
+            for future in futures:
+                future.cancel()
+        return texts
+
     def generate_summary(self, text: str) -> str:
         """Generate document summary using LLaMA."""
-        prompt = PromptTemplate(
-            template=SUMMARY_PROMPT_TEMPLATE,
-            input_variables=["text", "max_words"]
-        )
-
-        formatted_prompt = prompt.format(
+        formatted_prompt = self.prompts["summary"].format(
             text=text[:3000],  # Limit input for efficiency
             max_words=AUTO_SUMMARY_MAX_WORDS
         )
 
         try:
-            summary = self.llm(formatted_prompt)
+            summary = self.generate("summary", formatted_prompt)
             return summary.strip()
         except Exception as e:
             self.logger.error(f"Summary generation failed: {e}")
             return "Summary generation unavailable."
 
-    def create_qa_chain(self, vectorstore) -> RetrievalQA:
+    @profiled("llm_answer_question", all_threads=True)
+    def answer_question(self, vector_store, question: str, k: int = 3) -> Dict:
+        """Retrieve context from a VectorStoreManager and answer with the QA profile.
+
+        Equivalent to the "stuff" chain from ``create_qa_chain``, but with each
+        stage (retrieve, prompt build, generation) visible in telemetry.
+        """
+        source_docs = vector_store.search_documents(question, k=k)
+
+        with get_telemetry().span("prompt_build"):
+            qa_prompt = self.prompts["qa"]
+            max_new_tokens = GENERATION_PROFILES["qa"]["max_tokens"]
+            context = "\n\n".join(doc.page_content for doc in source_docs)
+            # Drop the least relevant sources if the prompt would overflow the context window
+            while len(source_docs) > 1 and not qa_prompt.fits(max_new_tokens, context=context, question=question):
+                source_docs = source_docs[:-1]
+                context = "\n\n".join(doc.page_content for doc in source_docs)
+            prompt = qa_prompt.format(context=context, question=question)
+
+        return {
+            "result": self.qa_llm(prompt),
+            "source_documents": source_docs
+        }
+
+    def create_qa_chain(self, vectorstore):
         """Create Question-Answering chain with retrieval."""
-        qa_prompt = PromptTemplate(
-            template=QA_PROMPT_TEMPLATE,
-            input_variables=["context", "question"]
-        )
+        from langchain.chains import RetrievalQA
 
         return RetrievalQA.from_chain_type(
-            llm=self.llm,
+            llm=self.qa_llm,
             chain_type="stuff",
             retriever=vectorstore.as_retriever(
                 search_kwargs={"k": 3}
             ),
             chain_type_kwargs={
-                "prompt": qa_prompt,
+                "prompt": self.prompts["qa"].prompt_template,
                 "verbose": True
             },
             return_source_documents=True
         )
 
-    def generate_questions(self, context: str, question_type: str = "mixed") -> List[Dict]:
-        """Generate questions from context using advanced NLP techniques."""
+    def generate_questions(self, context: str, question_type: str = "mixed",
+                           task: str = "question", raise_errors: bool = False) -> List[Dict]:
+        """Generate questions from context using advanced NLP techniques.
+
+        ``task`` selects the generation profile and queue priority
+        ("question_bank" for background generation). LLM failures return no
+        questions unless ``raise_errors`` is set.
+        """
         if question_type == "mixed":
-            questions = []
+            formatted_prompts = []
             for q_type in QUESTION_TYPES:
-                prompt = PromptTemplate(
-                    template=QUESTION_GENERATION_TEMPLATES[q_type],
-                    input_variables=["context"]
-                )
+                formatted_prompts.append(self.prompts[f"question:{q_type}"].format(context=context[:2000]))
 
-                formatted_prompt = prompt.format(context=context[:2000])
+            try:
+                responses = self.generate_batch(task, formatted_prompts)
+            except Exception as e:
+                if raise_errors:
+                    raise
+                self.logger.error(f"Question generation failed: {e}")
+                return []
 
-                try:
-                    response = self.llm(formatted_prompt)
-                    questions.append({
-                        "type": q_type,
-                        "question": response.strip(),
-                        "difficulty": self._assess_difficulty(response),
-                        "source_context": context[:500]
-                    })
-                except Exception as e:
-                    self.logger.error(f"Question generation failed for {q_type}: {e}")
+            questions = []
+            for q_type, response in zip(QUESTION_TYPES, responses):
+                questions.append({
+                    "type": q_type,
+                    "question": response.strip(),
+                    "difficulty": self._assess_difficulty(response),
+                    "source_context": context[:500]
+                })
 
             return questions
         else:
             # Single question type generation
-            prompt = PromptTemplate(
-                template=QUESTION_GENERATION_TEMPLATES[question_type],
-                input_variables=["context"]
-            )
-
-            formatted_prompt = prompt.format(context=context[:2000])
-            response = self.llm(formatted_prompt)
+            formatted_prompt = self.prompts[f"question:{question_type}"].format(context=context[:2000])
+            response = self.generate(task, formatted_prompt)
 
             return [{
                 "type": question_type,
@@ -152,19 +222,14 @@ class LangChainHelper:
 
     def evaluate_answer(self, question: str, user_answer: str, context: str) -> Dict:
         """Evaluate user's answer using multiple criteria."""
-        prompt = PromptTemplate(
-            template=EVALUATION_PROMPT_TEMPLATE,
-            input_variables=["question", "user_answer", "context"]
-        )
-
-        formatted_prompt = prompt.format(
+        formatted_prompt = self.prompts["evaluation"].format(
             question=question,
             user_answer=user_answer,
             context=context
         )
 
         try:
-            evaluation = self.llm(formatted_prompt)
+            evaluation = self.generate("evaluation", formatted_prompt)
             return self._parse_evaluation(evaluation)
         except Exception as e:
             self.logger.error(f"Answer evaluation failed: {e}")
@@ -188,7 +253,19 @@ class LangChainHelper:
 
     def _parse_evaluation(self, evaluation_text: str) -> Dict:
         """Parse LLM evaluation response into structured format."""
-        # Advanced parsing logic for evaluation response
+        # Grammar-constrained backends return JSON matching EVALUATION_JSON_SCHEMA
+        try:
+            data = json.loads(evaluation_text[evaluation_text.index("{"):evaluation_text.rindex("}") + 1])
+            return {
+                "score": max(0, min(int(data.get("score", 7)), 10)),
+                "feedback": str(data.get("feedback", "")),
+                "strengths": [str(s) for s in data.get("strengths", [])],
+                "improvements": [str(s) for s in data.get("improvements", [])]
+            }
+        except (ValueError, TypeError, AttributeError):
+            pass
+
+        # Fallback: free-text evaluation (e.g. backends without grammar support)
         lines = evaluation_text.strip().split('\n')
         result = {
             "score": 7,  # Default score
@@ -201,7 +278,6 @@ class LangChainHelper:
         for line in lines:
             if "score" in line.lower() or "rating" in line.lower():
                 try:
-                    import re
                     score_match = re.search(r'(\d+)', line)
                     if score_match:
                         result["score"] = min(int(score_match.group(1)), 10)
@@ -209,3 +285,9 @@ class LangChainHelper:
                     pass
 
         return result
+
+
+@lru_cache(maxsize=None)
+def get_langchain_helper() -> LangChainHelper:
+    """Return the process-wide helper shared by all sessions."""
+    return LangChainHelper()
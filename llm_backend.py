@@ -0,0 +1,628 @@
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.language_models.llms import LLM
+
+from config.settings import (
+    MODEL_PATH, MODEL_CONTEXT_LENGTH, MODEL_MAX_TOKENS, MODEL_TEMPERATURE,
+    LLM_BACKEND, LLM_THREADS, LLM_BATCH_SIZE, LLM_POOL_WORKERS, LLM_POOL_START_TIMEOUT,
+    QA_DECODING_MODE, DRAFT_MODEL_PATH, SPECULATIVE_NUM_DRAFT
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+def build_grammar(grammar: Optional[str] = None, json_schema: Optional[str] = None):
+    """Compile a GBNF grammar or a JSON schema string into a ``LlamaGrammar``."""
+    if not grammar and not json_schema:
+        return None
+    from llama_cpp import LlamaGrammar
+
+    if json_schema:
+        return LlamaGrammar.from_json_schema(json_schema, verbose=False)
+    return LlamaGrammar.from_string(grammar, verbose=False)
+
+
+def stream_completion(model, prompt: str, grammar: Optional[str] = None,
+                      json_schema: Optional[str] = None, **kwargs) -> Tuple[str, int, Dict[str, float]]:
+    """Run a streamed ``create_completion``; returns (text, tokens generated, stage timings).
+
+    ``prompt_eval`` lasts until the first streamed chunk arrives, ``generate``
+    covers the rest, matching the stages the batched scheduler reports.
+    """
+    start = time.perf_counter()
+    first_chunk_at = None
+    parts = []
+    for chunk in model.create_completion(prompt, grammar=build_grammar(grammar, json_schema),
+                                         stream=True, **kwargs):
+        if first_chunk_at is None:
+            first_chunk_at = time.perf_counter()
+        parts.append(chunk["choices"][0]["text"])
+    end = time.perf_counter()
+    first_chunk_at = first_chunk_at or end
+    text = "".join(parts)
+    n_tokens = len(model.tokenize(text.encode("utf-8"), add_bos=False))
+    return text, n_tokens, {"prompt_eval": first_chunk_at - start, "generate": end - first_chunk_at}
+
+
+def _submit_timed(executor: ThreadPoolExecutor, fn, *args, **kwargs) -> Future:
+    """Run ``fn`` (returning ``(text, timings)``) on ``executor``.
+
+    The timings are attached as ``future.timings`` before the result is set,
+    so waiters always see them, as with the batched scheduler's futures.
+    """
+    future = Future()
+
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            text, timings = fn(*args, **kwargs)
+        except Exception as e:
+            future.set_exception(e)
+        else:
+            future.timings = timings
+            future.set_result(text)
+
+    executor.submit(run)
+    return future
+
+
+def record_generation(task: str, backend: "LLMBackend", future: Future, text: str,
+                      max_tokens: int, elapsed: float):
+    """Record stage timings and token usage of one finished generation.
+
+    Backends that measure their own stages attach ``future.timings``; for the
+    others the whole call is recorded as the ``generate`` stage. Token usage
+    is logged against the global MODEL_MAX_TOKENS budget.
+    """
+    from helpers.telemetry import get_telemetry
+
+    telemetry = get_telemetry()
+    timings = getattr(future, "timings", None)
+    if timings:
+        for stage, seconds in timings.items():
+            telemetry.record(stage, seconds, task=task)
+    else:
+        telemetry.record("generate", elapsed, task=task)
+
+    used = backend.count_tokens(text)
+    telemetry.incr("tokens_total", used, task=task)
+    logger.info(f"[{task}] generated {used}/{max_tokens} tokens, "
+                f"saved {MODEL_MAX_TOKENS - used} vs default budget of {MODEL_MAX_TOKENS}")
+
+
+class LLMBackend(ABC):
+    """Common interface for everything that turns a prompt into text.
+
+    Backends return ``concurrent.futures.Future`` objects from ``submit`` and
+    count the tokens they generate in ``generated_tokens``. ``grammar`` (GBNF)
+    and ``json_schema`` (JSON string) constrain the output; generation ends
+    as soon as the constrained structure is complete.
+    """
+
+    name = "base"
+    generated_tokens = 0
+
+    @abstractmethod
+    def submit(self, prompt: str, max_tokens: int = MODEL_MAX_TOKENS,
+               temperature: float = MODEL_TEMPERATURE, top_p: float = 0.95,
+               repeat_penalty: float = 1.1, stop: Optional[List[str]] = None,
+               grammar: Optional[str] = None, json_schema: Optional[str] = None) -> Future:
+        """Queue a prompt and return a future for the generated text."""
+
+    def count_tokens(self, text: str) -> int:
+        """Number of model tokens in ``text`` (whitespace words when no tokenizer is loaded)."""
+        return len(text.split())
+
+    def map(self, prompts: List[str], **kwargs) -> List[Future]:
+        """Submit several prompts at once; results come back in order."""
+        return [self.submit(prompt, **kwargs) for prompt in prompts]
+
+    def generate(self, prompt: str, **kwargs) -> str:
+        """Blocking convenience wrapper around ``submit``."""
+        return self.submit(prompt, **kwargs).result()
+
+    def wait(self, future: Future, timeout: Optional[float] = None) -> str:
+        """Block until a submitted request has finished and return its text."""
+        return future.result(timeout)
+
+    @property
+    def capacity(self) -> int:
+        """How many requests the backend works on at the same time."""
+        return 1
+
+    @property
+    def context_length(self) -> int:
+        """Tokens one request may use, prompt and generated text together."""
+        return MODEL_CONTEXT_LENGTH
+
+    @property
+    def queue_depth(self) -> int:
+        return 0
+
+    def shutdown(self):
+        pass
+
+
+class LlamaCppBackend(LLMBackend):
+    """Single in-process llama.cpp model; prompts run one at a time."""
+
+    name = "llamacpp"
+
+    def __init__(self, model_path: str = MODEL_PATH, n_threads: int = LLM_THREADS):
+        import llama_cpp
+
+        self.model = llama_cpp.Llama(
+            model_path=model_path,
+            n_ctx=MODEL_CONTEXT_LENGTH,
+            n_batch=LLM_BATCH_SIZE,
+            n_threads=n_threads,
+            verbose=False
+        )
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="llm-llamacpp")
+
+    def _generate(self, prompt: str, **kwargs) -> Tuple[str, Dict[str, float]]:
+        text, n_tokens, timings = stream_completion(self.model, prompt, **kwargs)
+        self.generated_tokens += n_tokens
+        return text, timings
+
+    def submit(self, prompt: str, **kwargs) -> Future:
+        return _submit_timed(self.executor, self._generate, prompt, **kwargs)
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.model.tokenize(text.encode("utf-8"), add_bos=False))
+
+    @property
+    def queue_depth(self) -> int:
+        return self.executor._work_queue.qsize()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+
+class BatchedLlamaBackend(LLMBackend):
+    """In-process model shared by concurrent prompts via batched decoding."""
+
+    name = "batched"
+
+    def __init__(self, n_threads: int = LLM_THREADS):
+        from helpers.batch_inference import InferenceScheduler
+
+        self.scheduler = InferenceScheduler(n_threads=n_threads)
+
+    def submit(self, prompt: str, **kwargs) -> Future:
+        return self.scheduler.submit(prompt, **kwargs)
+
+    @property
+    def generated_tokens(self) -> int:
+        return self.scheduler.generated_tokens
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.scheduler.model.tokenize(text.encode("utf-8"), add_bos=False))
+
+    @property
+    def capacity(self) -> int:
+        return self.scheduler.max_sequences
+
+    @property
+    def context_length(self) -> int:
+        return self.scheduler.context_per_sequence
+
+    @property
+    def queue_depth(self) -> int:
+        return self.scheduler.queue_depth
+
+    def shutdown(self):
+        self.scheduler.shutdown()
+
+
+def _pool_worker(worker_id: int, model_path: str, n_threads: int, cores: List[int],
+                 requests, results):
+    """Worker process: hold one model replica and serve requests until ``None``."""
+    try:
+        if cores and hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, cores)
+
+        import llama_cpp
+
+        model = llama_cpp.Llama(
+            model_path=model_path,
+            n_ctx=MODEL_CONTEXT_LENGTH,
+            n_batch=LLM_BATCH_SIZE,
+            n_threads=n_threads,
+            verbose=False
+        )
+    except Exception as e:
+        results.put(("ready", worker_id, None, 0, repr(e), None))
+        return
+    results.put(("ready", worker_id, None, 0, None, None))
+
+    while True:
+        item = requests.get()
+        if item is None:
+            break
+        request_id, prompt, kwargs = item
+        try:
+            text, n_tokens, timings = stream_completion(model, prompt, **kwargs)
+            results.put((request_id, worker_id, text, n_tokens, None, timings))
+        except Exception as e:
+            results.put((request_id, worker_id, None, 0, repr(e), None))
+
+
+class WorkerPoolBackend(LLMBackend):
+    """Pool of worker processes, each holding its own model replica.
+
+    Every worker gets ``n_threads`` llama.cpp threads pinned to its own
+    block of cores, and each request goes to the live worker with the fewest
+    requests in flight. If a worker process dies, its pending requests fail
+    and it gets no new ones.
+    """
+
+    name = "pool"
+
+    def __init__(self, n_workers: int = LLM_POOL_WORKERS, n_threads: int = LLM_THREADS,
+                 model_path: str = MODEL_PATH, pin_cores: bool = True,
+                 start_timeout: float = LLM_POOL_START_TIMEOUT):
+        self.logger = logging.getLogger(__name__)
+        context = multiprocessing.get_context("spawn")
+        self.results = context.Queue()
+        self.requests = [context.Queue() for _ in range(n_workers)]
+        self.in_flight = [0] * n_workers
+        self.futures: Dict[int, Future] = {}
+        self.assigned: Dict[int, int] = {}  # request id -> worker id
+        self.dead = set()
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._closing = False
+
+        # Only the cores this process may run on (cpusets, taskset), not every core of the machine.
+        if hasattr(os, "sched_getaffinity"):
+            allowed = sorted(os.sched_getaffinity(0))
+        else:
+            allowed = list(range(os.cpu_count() or 1))
+        self.workers = []
+        for worker_id in range(n_workers):
+            cores = []
+            if pin_cores and (worker_id + 1) * n_threads <= len(allowed):
+                cores = allowed[worker_id * n_threads:(worker_id + 1) * n_threads]
+            process = context.Process(
+                target=_pool_worker,
+                args=(worker_id, model_path, n_threads, cores, self.requests[worker_id], self.results),
+                name=f"llm-worker-{worker_id}",
+                daemon=True
+            )
+            process.start()
+            self.workers.append(process)
+
+        self._wait_ready(start_timeout)
+
+        self._collector = threading.Thread(target=self._collect, name="llm-pool-collector", daemon=True)
+        self._collector.start()
+
+        # Tokenizer-only copy of the model for counting tokens in this process.
+        import llama_cpp
+
+        self.vocab = llama_cpp.Llama(model_path=model_path, vocab_only=True, verbose=False)
+
+    def _wait_ready(self, timeout: float):
+        """Block until every replica has loaded its model; fail fast if one dies or hangs."""
+        pending = set(range(len(self.workers)))
+        deadline = time.perf_counter() + timeout
+        while pending:
+            try:
+                _, worker_id, _, _, error, _ = self.results.get(timeout=1.0)
+            except queue.Empty:
+                error = None
+                for worker_id in pending:
+                    if not self.workers[worker_id].is_alive():
+                        error = f"process exited with code {self.workers[worker_id].exitcode}"
+                        break
+                else:
+                    if time.perf_counter() < deadline:
+                        continue
+                    worker_id = min(pending)
+                    error = f"no model loaded after {timeout:g}s"
+            if error:
+                self.shutdown_workers(timeout=5)
+                raise RuntimeError(f"LLM worker {worker_id} failed to load the model: {error}")
+            pending.discard(worker_id)
+
+    def submit(self, prompt: str, **kwargs) -> Future:
+        future = Future()
+        with self._lock:
+            live = [i for i in range(len(self.workers)) if i not in self.dead]
+            if not live:
+                raise RuntimeError("All LLM worker processes have exited.")
+            request_id = self._next_id
+            self._next_id += 1
+            worker_id = min(live, key=self.in_flight.__getitem__)
+            self.in_flight[worker_id] += 1
+            self.futures[request_id] = future
+            self.assigned[request_id] = worker_id
+        self.requests[worker_id].put((request_id, prompt, kwargs))
+        return future
+
+    def _fail_dead_workers(self):
+        """Fail the pending requests of workers that exited (crash, OOM kill)."""
+        with self._lock:
+            if self._closing:
+                return
+            newly_dead = {i for i, process in enumerate(self.workers)
+                          if i not in self.dead and not process.is_alive()}
+            if not newly_dead:
+                return
+            self.dead |= newly_dead
+            lost = [request_id for request_id, worker_id in self.assigned.items() if worker_id in newly_dead]
+            futures = [self.futures.pop(request_id) for request_id in lost]
+            for request_id in lost:
+                del self.assigned[request_id]
+            for worker_id in newly_dead:
+                self.in_flight[worker_id] = 0
+        for worker_id in newly_dead:
+            self.logger.error(f"LLM worker {worker_id} exited with code {self.workers[worker_id].exitcode}")
+        for future in futures:
+            if future.set_running_or_notify_cancel():
+                future.set_exception(RuntimeError("LLM worker process exited during the request."))
+
+    def _collect(self):
+        last_check = time.perf_counter()
+        while True:
+            try:
+                item = self.results.get(timeout=1.0)
+            except queue.Empty:
+                item = ()
+            # On a timer rather than only when idle: live workers may keep the queue busy.
+            if time.perf_counter() - last_check >= 1.0:
+                self._fail_dead_workers()
+                last_check = time.perf_counter()
+            if item is None:
+                break
+            if not item:
+                continue
+            request_id, worker_id, text, n_tokens, error, timings = item
+            with self._lock:
+                future = self.futures.pop(request_id, None)
+                if future is None:  # already failed as lost
+                    continue
+                del self.assigned[request_id]
+                self.in_flight[worker_id] -= 1
+                self.generated_tokens += n_tokens
+            # A cancelled future still used the worker; its result is dropped.
+            if not future.set_running_or_notify_cancel():
+                continue
+            if error:
+                future.set_exception(RuntimeError(f"LLM worker {worker_id} failed: {error}"))
+            else:
+                future.timings = timings
+                future.set_result(text)
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.vocab.tokenize(text.encode("utf-8"), add_bos=False))
+
+    @property
+    def capacity(self) -> int:
+        return max(1, len(self.workers) - len(self.dead))
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(self.in_flight)
+
+    def shutdown_workers(self, timeout: Optional[float] = None):
+        with self._lock:
+            self._closing = True
+        for requests in self.requests:
+            requests.put(None)
+        for process in self.workers:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+
+    def shutdown(self):
+        self.shutdown_workers()
+        self.results.put(None)
+        self._collector.join()
+
+
+class FakeBackend(LLMBackend):
+    """Deterministic, model-free backend for tests and load simulations.
+
+    The same prompt always yields the same text, built from a hash of the
+    prompt; with ``json_schema`` the text is a JSON object filled from the
+    schema. ``token_latency`` (seconds) simulates generation time.
+    """
+
+    name = "fake"
+
+    def __init__(self, token_latency: float = 0.0, max_workers: int = 1):
+        self.token_latency = token_latency
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-fake")
+
+    def _generate(self, prompt: str, max_tokens: int = MODEL_MAX_TOKENS,
+                  stop: Optional[List[str]] = None, json_schema: Optional[str] = None,
+                  **kwargs) -> str:
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        words = [digest[i:i + 6] for i in range(0, len(digest), 6)]
+        n_tokens = min(max_tokens, len(words))
+        text = " ".join(words[:n_tokens])
+        if json_schema:
+            text = json.dumps(self._fill_schema(json.loads(json_schema), int(digest, 16)))
+        for s in stop or []:
+            if s in text:
+                text = text[:text.find(s)]
+        if self.token_latency:
+            threading.Event().wait(self.token_latency * n_tokens)
+        with self._lock:
+            self.generated_tokens += n_tokens
+        return text
+
+    def _fill_schema(self, schema: Dict, seed: int):
+        """Deterministic value that satisfies a simple JSON schema."""
+        kind = schema.get("type")
+        if kind == "object":
+            return {key: self._fill_schema(sub, seed >> i) for i, (key, sub) in
+                    enumerate(schema.get("properties", {}).items())}
+        if kind == "array":
+            return [self._fill_schema(schema.get("items", {}), seed)]
+        if kind == "integer":
+            low, high = schema.get("minimum", 0), schema.get("maximum", 10)
+            return low + seed % (high - low + 1)
+        return f"fake-{seed % 10000:04d}"
+
+    def submit(self, prompt: str, **kwargs) -> Future:
+        return self.executor.submit(self._generate, prompt, **kwargs)
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers
+
+    @property
+    def queue_depth(self) -> int:
+        return self.executor._work_queue.qsize()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+
+class SpeculativeBackend(LLMBackend):
+    """Greedy speculative decoding for extractive answers.
+
+    ``mode`` is "prompt_lookup" (draft tokens copied from n-gram matches in
+    the prompt, the default) or "draft_model" (draft tokens from a small
+    GGUF at ``draft_model_path``). Output is identical to plain greedy
+    decoding.
+    """
+
+    name = "speculative"
+
+    def __init__(self, mode: str = "prompt_lookup", draft_model_path: str = DRAFT_MODEL_PATH,
+                 n_threads: int = LLM_THREADS):
+        from helpers.speculative_decoding import (
+            SpeculativeDecoder, PromptLookupProposer, DraftModelProposer
+        )
+
+        if mode == "prompt_lookup":
+            proposer = PromptLookupProposer()
+        elif mode == "draft_model":
+            if not draft_model_path:
+                raise ValueError("QA_DECODING_MODE=draft_model requires DRAFT_MODEL_PATH.")
+            proposer = DraftModelProposer(draft_model_path, n_threads=n_threads)
+        else:
+            raise ValueError(f"Unknown speculative decoding mode '{mode}'.")
+
+        self.decoder = SpeculativeDecoder(proposer=proposer, n_threads=n_threads)
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="llm-speculative")
+
+    def _generate(self, prompt: str, max_tokens: int = MODEL_MAX_TOKENS,
+                  stop: Optional[List[str]] = None, **kwargs) -> Tuple[str, Dict[str, float]]:
+        # Sampling parameters and grammars are ignored: verification is only exact for greedy decoding.
+        text = self.decoder.generate_text(prompt, max_tokens=max_tokens, stop=stop)
+        self.generated_tokens += self.count_tokens(text)
+        return text, dict(self.decoder.timings)
+
+    def submit(self, prompt: str, **kwargs) -> Future:
+        return _submit_timed(self.executor, self._generate, prompt, **kwargs)
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.decoder.model.tokenize(text.encode("utf-8"), add_bos=False))
+
+    @property
+    def context_length(self) -> int:
+        # Verification needs room for a full draft on top of the prompt and answer.
+        return MODEL_CONTEXT_LENGTH - SPECULATIVE_NUM_DRAFT - 1
+
+    @property
+    def queue_depth(self) -> int:
+        return self.executor._work_queue.qsize()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+
+BACKENDS = {
+    "llamacpp": LlamaCppBackend,
+    "batched": BatchedLlamaBackend,
+    "pool": WorkerPoolBackend,
+    "fake": FakeBackend,
+    "speculative": SpeculativeBackend,
+}
+
+
+def create_llm_backend(name: str = LLM_BACKEND, **kwargs) -> LLMBackend:
+    """Instantiate a backend by name (see ``BACKENDS``)."""
+    try:
+        backend_cls = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown LLM backend '{name}'. Available: {', '.join(BACKENDS)}")
+    return backend_cls(**kwargs)
+
+
+@lru_cache(maxsize=None)
+def get_llm_backend() -> LLMBackend:
+    """Return the process-wide backend so every session shares the models.
+
+    Requests go through one admission queue (see ``helpers.admission``).
+    When QA_DECODING_MODE asks for speculative decoding, "qa" requests run
+    on the speculative backend but still take their slot in that queue.
+    """
+    from helpers.admission import AdmissionBackend
+
+    task_backends = {}
+    if QA_DECODING_MODE != "standard":
+        task_backends["qa"] = create_llm_backend("speculative", mode=QA_DECODING_MODE)
+    return AdmissionBackend(create_llm_backend(), task_backends=task_backends)
+
+
+def get_qa_backend() -> LLMBackend:
+    """Return the backend for QA answers: the shared one, which routes task "qa" (see ``get_llm_backend``)."""
+    return get_llm_backend()
+
+
+class BackendLLM(LLM):
+    """LangChain LLM that delegates generation to an admission-controlled backend.
+
+    ``task`` sets the request's queue priority; timings and token usage are
+    recorded under it.
+    """
+
+    backend: Any
+    task: str = "llm"
+    max_tokens: int = MODEL_MAX_TOKENS
+    temperature: float = MODEL_TEMPERATURE
+    top_p: float = 0.95
+    repeat_penalty: float = 1.1
+    stop: Optional[List[str]] = None
+
+    @property
+    def _llm_type(self) -> str:
+        return f"backend_{self.backend.name}"
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None,
+              run_manager=None, **kwargs) -> str:
+        max_tokens = kwargs.get("max_tokens", self.max_tokens)
+        start = time.perf_counter()
+        future = self.backend.submit(
+            prompt,
+            max_tokens=max_tokens,
+            temperature=kwargs.get("temperature", self.temperature),
+            top_p=self.top_p,
+            repeat_penalty=self.repeat_penalty,
+            stop=stop or self.stop,
+            task=self.task
+        )
+        text = self.backend.wait(future)
+        record_generation(self.task, self.backend, future, text, max_tokens, time.perf_counter() - start)
+        return text
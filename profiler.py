@@ -0,0 +1,214 @@
+import contextvars
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Optional
+
+from config.settings import (
+    PROFILING_ENABLED, PROFILER_INTERVAL, PROFILER_MAX_OVERHEAD, PROFILER_MAX_FILES,
+    PROFILER_FORMAT, PROFILES_DIR
+)
+
+
+# Set per Streamlit rerun when the page is opened with ?profile=1
+_request_enabled = contextvars.ContextVar("profiling_request_enabled", default=False)
+_active_profiler = contextvars.ContextVar("active_profiler", default=None)
+
+
+def enable_for_request(enabled: bool):
+    """Turn profiling on or off for the current context (one Streamlit rerun)."""
+    _request_enabled.set(enabled)
+
+
+def profiling_enabled() -> bool:
+    return PROFILING_ENABLED or _request_enabled.get()
+
+
+class SamplingProfiler:
+    """Low-overhead statistical profiler driven by a background thread.
+
+    Every ``interval`` seconds the sampler reads the target thread's stack
+    from ``sys._current_frames()`` and counts it as a collapsed stack. Taking
+    a sample briefly holds the GIL, so the sampler measures its own cost and
+    stretches the interval whenever cost / interval would exceed
+    ``max_overhead``; the profiled code is never slowed down by more than
+    that fraction.
+    """
+
+    def __init__(self, name: str, interval: float = PROFILER_INTERVAL,
+                 max_overhead: float = PROFILER_MAX_OVERHEAD):
+        self.name = name
+        self.interval = interval
+        self.max_overhead = max_overhead
+        self.target_thread = threading.get_ident()
+        self.all_threads = 0  # >0 while nested sections want every thread sampled
+        self.samples = Counter()
+        self.sample_cost = 0.0
+        self.started = None
+        self.duration = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"profiler-{name}", daemon=True)
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self.started
+
+    @property
+    def overhead(self) -> float:
+        """Fraction of wall time spent taking samples."""
+        return self.sample_cost / self.duration if self.duration else 0.0
+
+    @staticmethod
+    def _collapse(frame) -> str:
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return ";".join(reversed(stack))
+
+    def _run(self):
+        own_thread = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            start = time.perf_counter()
+            frames = sys._current_frames()
+            if self.all_threads:
+                if len(names) != len(frames):
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                for ident, frame in frames.items():
+                    if ident != own_thread:
+                        self.samples[f"{names.get(ident, ident)};{self._collapse(frame)}"] += 1
+            elif self.target_thread in frames:
+                self.samples[f"main;{self._collapse(frames[self.target_thread])}"] += 1
+            del frames
+
+            cost = time.perf_counter() - start
+            self.sample_cost += cost
+            # Keep cost / interval under the overhead budget.
+            self.interval = max(self.interval, cost / self.max_overhead)
+
+    def to_collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+    def to_speedscope(self) -> str:
+        frames, index = [], {}
+        samples, weights = [], []
+        total = sum(self.samples.values()) or 1
+        for stack, count in self.samples.most_common():
+            ids = []
+            for name in stack.split(";"):
+                if name not in index:
+                    index[name] = len(frames)
+                    frames.append({"name": name})
+                ids.append(index[name])
+            samples.append(ids)
+            weights.append(self.duration * count / total)
+        return json.dumps({
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": self.name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": self.duration,
+                "samples": samples,
+                "weights": weights
+            }],
+            "name": self.name,
+            "exporter": f"research-assistant sampler (overhead {self.overhead:.2%})"
+        })
+
+    def save(self, directory=PROFILES_DIR, fmt: str = PROFILER_FORMAT) -> str:
+        """Write the profile and prune old files beyond PROFILER_MAX_FILES."""
+        os.makedirs(directory, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        if fmt == "collapsed":
+            path = os.path.join(directory, f"{stamp}_{self.name}.folded")
+            content = self.to_collapsed()
+        else:
+            path = os.path.join(directory, f"{stamp}_{self.name}.speedscope.json")
+            content = self.to_speedscope()
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+        _prune(directory)
+        return path
+
+
+def _prune(directory, max_files: int = PROFILER_MAX_FILES):
+    """Keep only the newest ``max_files`` profiles."""
+    paths = sorted(
+        (os.path.join(directory, name) for name in os.listdir(directory)),
+        key=os.path.getmtime
+    )
+    if max_files <= 0:
+        return
+    for path in paths[:-max_files]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+@contextmanager
+def profile(name: str, all_threads: bool = False):
+    """Profile the enclosed block if profiling is enabled.
+
+    Nested sections reuse the outermost profiler; ``all_threads`` widens it
+    to every thread while the section runs (used around LLM calls, whose
+    work happens on backend threads).
+    """
+    active: Optional[SamplingProfiler] = _active_profiler.get()
+    if active is not None:
+        active.all_threads += all_threads
+        try:
+            yield
+        finally:
+            active.all_threads -= all_threads
+        return
+
+    if not profiling_enabled():
+        yield
+        return
+
+    profiler = SamplingProfiler(name)
+    profiler.all_threads = int(all_threads)
+    token = _active_profiler.set(profiler)
+    profiler.start()
+    try:
+        yield
+    finally:
+        profiler.stop()
+        _active_profiler.reset(token)
+        try:
+            path = profiler.save()
+            logging.getLogger(__name__).info(
+                f"Profile '{name}': {profiler.duration:.2f}s, {sum(profiler.samples.values())} samples, "
+                f"overhead {profiler.overhead:.2%} -> {path}"
+            )
+        except OSError as e:
+            logging.getLogger(__name__).warning(f"Could not write profile '{name}': {e}")
+
+
+def profiled(name: str, all_threads: bool = False):
+    """Decorator form of ``profile``."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with profile(name, all_threads=all_threads):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
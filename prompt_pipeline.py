@@ -0,0 +1,59 @@
+from string import Formatter
+from typing import Callable, Dict
+
+from langchain.prompts import PromptTemplate
+
+from config.prompts import (
+    SUMMARY_PROMPT_TEMPLATE, QA_PROMPT_TEMPLATE,
+    QUESTION_GENERATION_TEMPLATES, EVALUATION_PROMPT_TEMPLATE
+)
+from config.settings import MODEL_CONTEXT_LENGTH
+
+
+class CompiledPrompt:
+    """A prompt template parsed once, with the token count of its static text.
+
+    ``format`` is a plain ``str.format`` call, which renders f-string
+    templates exactly like ``PromptTemplate.format`` without re-validating
+    the template on every request. ``context_length`` is the per-request
+    context of the backend the prompt is sent to.
+    """
+
+    def __init__(self, template: str, count_tokens: Callable[[str], int],
+                 context_length: int = MODEL_CONTEXT_LENGTH):
+        parsed = list(Formatter().parse(template))
+        self.template = template
+        self.context_length = context_length
+        self.input_variables = sorted({name for _, name, _, _ in parsed if name})
+        self.count_tokens = count_tokens
+        self.static_tokens = count_tokens("".join(literal for literal, _, _, _ in parsed))
+        self.prompt_template = PromptTemplate(template=template, input_variables=self.input_variables)
+
+    def format(self, **kwargs) -> str:
+        return self.template.format(**kwargs)
+
+    def fits(self, max_new_tokens: int, **kwargs) -> bool:
+        """Whether the formatted prompt plus ``max_new_tokens`` fits the request context.
+
+        Only the variable parts are measured. Every token covers at least one
+        UTF-8 byte, so the byte length is a cheap upper bound that skips
+        tokenization for prompts that clearly fit.
+        """
+        budget = self.context_length - max_new_tokens - self.static_tokens - 1  # BOS
+        values = [str(value) for value in kwargs.values()]
+        if sum(len(value.encode("utf-8")) for value in values) <= budget:
+            return True
+        return sum(self.count_tokens(value) for value in values) <= budget
+
+
+def compile_prompts(count_tokens: Callable[[str], int],
+                    context_length: int = MODEL_CONTEXT_LENGTH) -> Dict[str, CompiledPrompt]:
+    """Compile every template in ``config/prompts.py``; question prompts are keyed ``question:<type>``."""
+    prompts = {
+        "summary": CompiledPrompt(SUMMARY_PROMPT_TEMPLATE, count_tokens, context_length),
+        "qa": CompiledPrompt(QA_PROMPT_TEMPLATE, count_tokens, context_length),
+        "evaluation": CompiledPrompt(EVALUATION_PROMPT_TEMPLATE, count_tokens, context_length),
+    }
+    for q_type, template in QUESTION_GENERATION_TEMPLATES.items():
+        prompts[f"question:{q_type}"] = CompiledPrompt(template, count_tokens, context_length)
+    return prompts
@@ -1,4 +1,5 @@
 # config/prompts.py
+import json
 
 SUMMARY_PROMPT_TEMPLATE = "Summarize the following text in {max_words} words:\n\n{text}\n"
 
@@ -16,5 +17,27 @@ EVALUATION_PROMPT_TEMPLATE = (
     "User's answer: {user_answer}\n"
     "Reference context: {context}\n"
     "Evaluate the answer for accuracy, completeness, and clarity. "
-    "Provide a score out of 10, strengths, and areas for improvement."
+    "Provide a score out of 10, strengths, and areas for improvement.\n"
+    "Respond only with JSON containing score, feedback, strengths and improvements.\n"
 )
+
+# Output constraints used by the generation profiles in config/settings.py
+QUESTION_GRAMMAR = r'''root ::= [^?\n]+ "?"'''
+
+EVALUATION_JSON_SCHEMA = json.dumps({
+    "type": "object",
+    "properties": {
+        "score": {"type": "integer", "minimum": 0, "maximum": 10},
+        "feedback": {"type": "string"},
+        "strengths": {"type": "array", "items": {"type": "string"}},
+        "improvements": {"type": "array", "items": {"type": "string"}}
+    },
+    "required": ["score", "feedback", "strengths", "improvements"]
+})
+
+# Per-task output constraints, merged into GENERATION_PROFILES by LangChainHelper
+OUTPUT_CONSTRAINTS = {
+    "question": {"grammar": QUESTION_GRAMMAR},
+    "question_bank": {"grammar": QUESTION_GRAMMAR},
+    "evaluation": {"json_schema": EVALUATION_JSON_SCHEMA}
+}
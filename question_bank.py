@@ -0,0 +1,159 @@
+import logging
+import math
+import random
+import threading
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from config.settings import (
+    QUESTION_TYPES, QUESTION_BANK_SECTIONS, QUESTION_BANK_CHUNKS_PER_SECTION
+)
+from helpers.telemetry import get_telemetry
+
+
+class _DocumentBank:
+    """Questions of one document, indexed by (type, difficulty)."""
+
+    def __init__(self, sections: int):
+        self.status = "building"  # building | ready | failed
+        self.sections = sections
+        self.sections_done = 0
+        self.questions: List[Dict] = []
+        self.index: Dict[tuple, List[int]] = defaultdict(list)
+        self.seen = set()
+
+    def add(self, question: Dict):
+        text = question["question"].strip()
+        if not text or text.lower() in self.seen:
+            return
+        self.seen.add(text.lower())
+        self.index[(question["type"], question["difficulty"])].append(len(self.questions))
+        self.questions.append(question)
+
+
+class QuestionBank:
+    """Per-document challenge questions generated in the background at ingest.
+
+    ``build_async`` picks ``QUESTION_BANK_SECTIONS`` evenly spaced runs of
+    adjacent chunks so questions cover the whole document, not just its
+    opening, and generates one question of every type per section at the
+    lowest LLM priority. Each question is stored with its type, difficulty
+    and source chunk ids; ``sample`` then serves a Challenge Me request by
+    filtered random sampling, without calling the LLM.
+
+    Banks are keyed by the document's content hash, so sessions uploading
+    different files with the same name never share questions, while
+    re-uploads of the same content reuse the existing bank.
+    """
+
+    def __init__(self, langchain_helper=None):
+        self.logger = logging.getLogger(__name__)
+        self.telemetry = get_telemetry()
+        self._langchain_helper = langchain_helper
+        self.banks: Dict[str, _DocumentBank] = {}
+        self._lock = threading.Lock()
+        # One build at a time; they are background work anyway.
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="question-bank")
+
+    @property
+    def langchain_helper(self):
+        if self._langchain_helper is None:
+            from helpers.langchain_helper import get_langchain_helper
+
+            self._langchain_helper = get_langchain_helper()
+        return self._langchain_helper
+
+    @staticmethod
+    def select_sections(n_chunks: int, sections: int = QUESTION_BANK_SECTIONS,
+                        width: int = QUESTION_BANK_CHUNKS_PER_SECTION) -> List[List[int]]:
+        """Chunk ids of up to ``sections`` evenly spaced runs of ``width`` adjacent chunks."""
+        width = min(width, n_chunks)
+        if width == 0:
+            return []
+        sections = min(sections, math.ceil(n_chunks / width))
+        last_start = n_chunks - width
+        starts = sorted({round(i * last_start / max(1, sections - 1)) for i in range(sections)})
+        return [list(range(start, start + width)) for start in starts]
+
+    def build_async(self, doc_id: str, chunks: List[str]) -> Optional[Future]:
+        """Start building the bank for a document, unless it is already built or building.
+
+        Returns ``None`` when an existing bank is reused; a failed build is retried.
+        """
+        sections = self.select_sections(len(chunks))
+        with self._lock:
+            existing = self.banks.get(doc_id)
+            if existing is not None and existing.status != "failed":
+                self.telemetry.incr("cache_hits_total", cache="question_bank")
+                return None
+            bank = self.banks[doc_id] = _DocumentBank(len(sections))
+        return self.executor.submit(self._build, doc_id, bank, chunks, sections)
+
+    def _build(self, doc_id: str, bank: _DocumentBank, chunks: List[str], sections: List[List[int]]):
+        try:
+            with self.telemetry.span("question_bank", sections=len(sections)):
+                for chunk_ids in sections:
+                    context = "\n\n".join(chunks[i] for i in chunk_ids)
+                    questions = self.langchain_helper.generate_questions(
+                        context=context, question_type="mixed", task="question_bank", raise_errors=True
+                    )
+                    if not questions:
+                        raise RuntimeError(f"no questions generated for chunks {chunk_ids}")
+                    with self._lock:
+                        for question in questions:
+                            bank.add({**question, "chunk_ids": chunk_ids})
+                        bank.sections_done += 1
+                    self.telemetry.incr("questions_generated_total", len(questions))
+            bank.status = "ready"
+            self.logger.info(f"Question bank for {doc_id}: {len(bank.questions)} questions "
+                             f"from {len(sections)} sections")
+        except Exception as e:
+            self.logger.error(f"Question bank build failed for {doc_id}: {e}")
+            bank.status = "failed"
+
+    def status(self, doc_id: str) -> str:
+        """Build state of a document's bank: missing, building, ready or failed."""
+        bank = self.banks.get(doc_id)
+        return bank.status if bank else "missing"
+
+    def progress(self, doc_id: str) -> tuple:
+        """(sections done, total sections, questions so far) for a document."""
+        bank = self.banks.get(doc_id)
+        if bank is None:
+            return 0, 0, 0
+        with self._lock:
+            return bank.sections_done, bank.sections, len(bank.questions)
+
+    def sample(self, doc_id: str, difficulty: Optional[str] = None,
+               n: int = len(QUESTION_TYPES), rng: Optional[random.Random] = None) -> List[Dict]:
+        """Up to ``n`` random questions, optionally of one difficulty, covering as many types as possible."""
+        bank = self.banks.get(doc_id)
+        if bank is None:
+            return []
+        rng = rng or random.Random()
+
+        with self._lock:
+            by_type = {}
+            for (q_type, q_difficulty), ids in bank.index.items():
+                if difficulty is None or q_difficulty == difficulty:
+                    by_type.setdefault(q_type, []).extend(ids)
+            pools = [rng.sample(ids, len(ids)) for ids in by_type.values()]
+            rng.shuffle(pools)
+
+            # Take one question per type in turn until n are picked.
+            picked = []
+            while len(picked) < n and any(pools):
+                for pool in pools:
+                    if pool and len(picked) < n:
+                        picked.append(dict(bank.questions[pool.pop()]))
+
+        self.telemetry.incr("question_bank_served_total", len(picked))
+        return picked
+
+
+@lru_cache(maxsize=None)
+def get_question_bank() -> QuestionBank:
+    """Return the process-wide question bank shared by all sessions."""
+    return QuestionBank()
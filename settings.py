@@ -1,26 +1,75 @@
+import json
 import os
 from pathlib import Path
 
 
 # Model Configuration
 # config/settings.py
-MODEL_PATH = r"C:\model\llama-2-7b-chat.Q4_K_M.gguf"
+MODEL_PATH = os.getenv("MODEL_PATH", r"C:\model\llama-2-7b-chat.Q4_K_M.gguf")
 # Updated path
 MODEL_TYPE = "llama"
 MODEL_CONTEXT_LENGTH = 4096
 MODEL_MAX_TOKENS = 512
 MODEL_TEMPERATURE = 0.7
 
+# LLM Inference Configuration
+# Backends: "llamacpp" (one in-process model), "batched" (one model, batched decoding),
+# "pool" (worker processes with one model replica each), "fake" (deterministic, for tests)
+LLM_BACKEND = os.getenv("LLM_BACKEND", "llamacpp")
+LLM_THREADS = int(os.getenv("LLM_THREADS", 8))
+LLM_POOL_WORKERS = int(os.getenv("LLM_POOL_WORKERS", max(1, (os.cpu_count() or 1) // LLM_THREADS)))
+LLM_POOL_START_TIMEOUT = 600  # seconds for every pool worker to load its model
+LLM_BATCH_SIZE = 512
+LLM_BATCH_MAX_SEQUENCES = 4
+LLM_BATCH_CONTEXT_PER_SEQUENCE = 2048  # tokens per request (prompt + output) in the batched backend
+
+# Admission control: all sessions share one LLM queue in front of the backend.
+# Lower priority numbers run first; within a priority, sessions take turns.
+LLM_MAX_CONCURRENT = int(os.getenv("LLM_MAX_CONCURRENT", 0))  # 0 = what the backend runs at once
+LLM_TASK_PRIORITIES = {"qa": 0, "evaluation": 0, "question": 1, "llm": 1, "summary": 2, "question_bank": 3}
+LLM_QUEUE_TIMEOUT = 120  # seconds a request may wait for a free slot
+LLM_REQUEST_TIMEOUT = 300  # seconds a caller waits for a result, queueing included
+LLM_QUEUE_POLL_INTERVAL = 0.5  # seconds between queue position updates in the UI
+
+# Speculative decoding for QA answers: "standard", "prompt_lookup" or "draft_model".
+# Speculative modes decode greedily and load a separate copy of the model.
+QA_DECODING_MODE = os.getenv("QA_DECODING_MODE", "standard")
+DRAFT_MODEL_PATH = os.getenv("DRAFT_MODEL_PATH", "")
+SPECULATIVE_NUM_DRAFT = 10
+SPECULATIVE_MAX_NGRAM = 3
+
+# Per-task generation limits (output grammars live in config/prompts.py)
+GENERATION_PROFILES = {
+    "summary": {"max_tokens": 224, "temperature": MODEL_TEMPERATURE, "stop": ["\n\n\n"]},
+    "qa": {"max_tokens": 256, "temperature": MODEL_TEMPERATURE, "stop": ["\nQuestion:", "\nContext:"]},
+    "question": {"max_tokens": 48, "temperature": MODEL_TEMPERATURE, "stop": ["\n\n"]},
+    "evaluation": {"max_tokens": 192, "temperature": 0.2, "stop": []}
+}
+# Background question-bank generation: same limits as on-demand questions, lowest priority
+GENERATION_PROFILES["question_bank"] = GENERATION_PROFILES["question"]
+
 # Embedding Configuration
 EMBEDDING_MODEL = "all-MiniLM-L6-v2"
 EMBEDDING_DIMENSION = 384
+EMBEDDING_MAX_TOKENS = 256  # all-MiniLM-L6-v2 truncates input beyond this
+QUERY_EMBEDDING_CACHE_SIZE = 1024  # query vectors kept in the shared LRU cache
 CHUNK_SIZE = 1000
 CHUNK_OVERLAP = 200
 
+# Token-aware chunking (sizes in tokenizer tokens, special tokens excluded)
+CHUNK_TOKENIZER = f"sentence-transformers/{EMBEDDING_MODEL}"
+CHUNK_SIZE_TOKENS = 250
+CHUNK_OVERLAP_TOKENS = 40
+
 # Vector Store Configuration
 VECTORSTORE_PERSIST_DIR = "./data/vectorstore"
 COLLECTION_NAME = "documents"
 
+# Retrieval: "similarity" (plain top-k) or "mmr" (diverse top-k, adjacent chunks merged into spans)
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "similarity")
+MMR_FETCH_K = 20  # candidates fetched before MMR picks k
+MMR_LAMBDA = 0.5  # 1.0 = relevance only, 0.0 = diversity only
+
 # UI Configuration
 PAGE_TITLE = "🔬 AI Research Assistant"
 PAGE_ICON = "🔬"
@@ -30,6 +79,9 @@ SIDEBAR_STATE = "expanded"
 # File Upload Configuration
 SUPPORTED_FORMATS = ["pdf", "txt", "docx"]
 MAX_FILE_SIZE = 200  # MB
+EXTRACTION_BLOCK_SIZE = 1024 * 1024  # bytes read per step when streaming uploads
+ENCODING_SAMPLE_BYTES = 64 * 1024  # bytes used to detect a TXT file's encoding
+MAX_EXTRACTED_CHARS = 64 * 1024 * 1024  # hard ceiling on text kept from one document
 AUTO_SUMMARY_MAX_WORDS = 150
 
 # Question Generation Configuration
@@ -37,13 +89,43 @@ QUESTION_TYPES = ["factual", "analytical", "inferential", "evaluative"]
 NUM_QUESTIONS_GENERATE = 3
 EVALUATION_CRITERIA = ["accuracy", "completeness", "relevance", "clarity"]
 
+# Question bank (built in the background after ingest, keyed by content hash; Challenge Me samples from it)
+QUESTION_BANK_SECTIONS = 6  # evenly spaced places in the document that questions are drawn from
+QUESTION_BANK_CHUNKS_PER_SECTION = 2  # adjacent chunks joined into one question context
+
 # Paths
 BASE_DIR = Path(__file__).parent.parent
 DATA_DIR = BASE_DIR / "data"
 DOCUMENTS_DIR = DATA_DIR / "documents"
 EMBEDDINGS_DIR = DATA_DIR / "embeddings"
 
+# HNSW index parameters for new vector store collections (Chroma defaults).
+# `python benchmarks.py hnsw --write` saves tuned values to HNSW_CONFIG_FILE, which overrides these.
+HNSW_CONFIG_FILE = DATA_DIR / "hnsw_config.json"
+HNSW_PARAMS = {"hnsw:space": "l2", "hnsw:M": 16, "hnsw:construction_ef": 100, "hnsw:search_ef": 10}
+if HNSW_CONFIG_FILE.exists():
+    HNSW_PARAMS.update(json.loads(HNSW_CONFIG_FILE.read_text(encoding="utf-8")))
+
+# Extraction cache (parsed text keyed by content hash, gzip-compressed, LRU-evicted)
+EXTRACTION_CACHE_DIR = DATA_DIR / "cache" / "extracted"
+EXTRACTION_CACHE_MAX_MB = 512
+
+# Telemetry Configuration
+TELEMETRY_MAX_TRACES = 50
+TELEMETRY_TRACE_FILE = os.getenv("TRACE_FILE", "")  # opt-in JSONL trace log, e.g. data/traces.jsonl
+TELEMETRY_TRACE_MAX_BYTES = 10 * 1024 * 1024  # the trace file is rotated to <file>.1 at this size
+TELEMETRY_PROMETHEUS_PORT = int(os.getenv("METRICS_PORT", 0))  # 0 disables the /metrics endpoint
+
+# Profiling Configuration (opt-in: RESEARCH_ASSISTANT_PROFILE=1 or open the app with ?profile=1)
+PROFILING_ENABLED = os.getenv("RESEARCH_ASSISTANT_PROFILE", "") == "1"
+PROFILES_DIR = DATA_DIR / "profiles"
+PROFILER_FORMAT = os.getenv("PROFILER_FORMAT", "speedscope")  # "speedscope" or "collapsed"
+PROFILER_INTERVAL = 0.01  # seconds between samples
+PROFILER_MAX_OVERHEAD = 0.02  # sampling never takes more than this fraction of wall time
+PROFILER_MAX_FILES = 50
+
 
-# Ensure directories exist
-for dir_path in [DATA_DIR, DOCUMENTS_DIR, EMBEDDINGS_DIR]:
-    dir_path.mkdir(parents=True, exist_ok=True)
+def ensure_data_dirs():
+    """Create the data directories (called on first use, not at import time)."""
+    for dir_path in [DATA_DIR, DOCUMENTS_DIR, EMBEDDINGS_DIR]:
+        dir_path.mkdir(parents=True, exist_ok=True)
@@ -0,0 +1,161 @@
+import time
+from typing import List, Optional
+
+import numpy as np
+import llama_cpp
+
+from config.settings import (
+    MODEL_PATH, MODEL_CONTEXT_LENGTH, MODEL_MAX_TOKENS, LLM_THREADS, LLM_BATCH_SIZE,
+    SPECULATIVE_NUM_DRAFT, SPECULATIVE_MAX_NGRAM
+)
+
+
+class PromptLookupProposer:
+    """Propose continuations by matching the latest n-gram against earlier tokens.
+
+    Extractive answers mostly copy spans of the stuffed context, so the
+    tokens that followed the last occurrence of the current suffix are a
+    good, free guess for what comes next.
+    """
+
+    def __init__(self, max_ngram: int = SPECULATIVE_MAX_NGRAM, num_draft: int = SPECULATIVE_NUM_DRAFT):
+        self.max_ngram = max_ngram
+        self.num_draft = num_draft
+
+    def propose(self, tokens: List[int]) -> List[int]:
+        arr = np.asarray(tokens, dtype=np.int64)
+        for n in range(min(self.max_ngram, len(arr) - 1), 0, -1):
+            # Windows that start before the suffix itself.
+            windows = np.lib.stride_tricks.sliding_window_view(arr[:-1], n)
+            matches = np.flatnonzero((windows == arr[-n:]).all(axis=1))
+            if len(matches):
+                start = int(matches[-1]) + n
+                return arr[start:start + self.num_draft].tolist()
+        return []
+
+
+class DraftModelProposer:
+    """Propose continuations by greedy decoding with a small draft GGUF.
+
+    The draft model must share the main model's vocabulary. Its KV cache
+    is reused across calls up to the longest common token prefix.
+    """
+
+    def __init__(self, model_path: str, num_draft: int = SPECULATIVE_NUM_DRAFT,
+                 n_threads: int = LLM_THREADS):
+        self.num_draft = num_draft
+        self.model = llama_cpp.Llama(
+            model_path=model_path,
+            n_ctx=MODEL_CONTEXT_LENGTH,
+            n_batch=LLM_BATCH_SIZE,
+            n_threads=n_threads,
+            verbose=False
+        )
+
+    def propose(self, tokens: List[int]) -> List[int]:
+        model = self.model
+        cached = model.input_ids[:model.n_tokens]
+        prefix = 0
+        for a, b in zip(cached, tokens[:-1]):
+            if a != b:
+                break
+            prefix += 1
+        model.n_tokens = prefix
+        model.eval(tokens[prefix:])
+
+        draft = []
+        for _ in range(self.num_draft):
+            token = int(np.argmax(model.scores[model.n_tokens - 1]))
+            if token == model.token_eos():
+                break
+            draft.append(token)
+            model.eval([token])
+        return draft
+
+
+class SpeculativeDecoder:
+    """Greedy decoding that verifies proposed tokens with one batched forward pass.
+
+    All proposed tokens are evaluated together and accepted up to the first
+    position where the main model's argmax disagrees; that argmax is then
+    emitted instead. The emitted sequence is therefore exactly the one plain
+    greedy decoding would produce, only with fewer forward passes.
+    """
+
+    def __init__(self, model_path: str = MODEL_PATH, proposer=None, n_threads: int = LLM_THREADS):
+        self.proposer = proposer
+        self.model = llama_cpp.Llama(
+            model_path=model_path,
+            n_ctx=MODEL_CONTEXT_LENGTH,
+            n_batch=LLM_BATCH_SIZE,
+            n_threads=n_threads,
+            logits_all=True,
+            verbose=False
+        )
+        self.forward_passes = 0
+        self.accepted_draft_tokens = 0
+        self.timings = {}  # stage timings of the last generate() call
+
+    def generate(self, prompt: str, max_tokens: int = MODEL_MAX_TOKENS,
+                 stop: Optional[List[str]] = None) -> List[int]:
+        """Return the greedy completion of ``prompt`` as token ids; stage timings go to ``timings``."""
+        model = self.model
+        stop_bytes = [s.encode("utf-8") for s in stop or []]
+
+        tokens = model.tokenize(prompt.encode("utf-8"), add_bos=True)
+        # Like llama.cpp's own completion call, refuse prompts that don't fit rather than cut them.
+        budget = MODEL_CONTEXT_LENGTH - SPECULATIVE_NUM_DRAFT - 1
+        if len(tokens) + max_tokens > budget:
+            raise ValueError(f"Prompt of {len(tokens)} tokens plus {max_tokens} new tokens exceeds the "
+                             f"{budget}-token context left for speculative decoding.")
+        start = time.perf_counter()
+        model.reset()
+        model.eval(tokens[:-1])
+        prompt_done = time.perf_counter()
+        try:
+            return self._decode(tokens, [tokens[-1]], max_tokens, stop_bytes)
+        finally:
+            self.timings = {"prompt_eval": prompt_done - start, "generate": time.perf_counter() - prompt_done}
+
+    def _decode(self, tokens: List[int], pending: List[int], max_tokens: int,
+                stop_bytes: List[bytes]) -> List[int]:
+        """Draft-and-verify loop after the prompt (all but its last token) is in the KV cache."""
+        model = self.model
+        eos = model.token_eos()
+        generated = []
+
+        while True:
+            draft = self.proposer.propose(tokens + generated) if self.proposer else []
+            draft = draft[:max(0, max_tokens - len(generated) - 1)]
+
+            base = model.n_tokens
+            batch = pending + draft
+            model.eval(batch)
+            self.forward_passes += 1
+
+            for i in range(len(batch)):
+                token = int(np.argmax(model.scores[base + i]))
+                if token == eos:
+                    return generated
+                generated.append(token)
+
+                if stop_bytes and any(s in model.detokenize(generated) for s in stop_bytes):
+                    return generated
+                if len(generated) >= max_tokens:
+                    return generated
+
+                if i < len(draft) and token == draft[i]:
+                    self.accepted_draft_tokens += 1
+                    continue
+                # Drop the KV entries of rejected draft tokens.
+                model.n_tokens = base + i + 1
+                pending = [token]
+                break
+
+    def generate_text(self, prompt: str, max_tokens: int = MODEL_MAX_TOKENS,
+                      stop: Optional[List[str]] = None) -> str:
+        text = self.model.detokenize(self.generate(prompt, max_tokens, stop)).decode("utf-8", errors="ignore")
+        for s in stop or []:
+            if s in text:
+                text = text[:text.find(s)]
+        return text
@@ -0,0 +1,252 @@
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque, defaultdict
+from contextlib import contextmanager
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+
+from config.settings import (
+    TELEMETRY_MAX_TRACES, TELEMETRY_TRACE_FILE, TELEMETRY_TRACE_MAX_BYTES, TELEMETRY_PROMETHEUS_PORT,
+    ensure_data_dirs
+)
+
+
+METRIC_PREFIX = "research_assistant"
+
+METRIC_HELP = {
+    "tokens_total": "Tokens generated by the LLM backends.",
+    "questions_generated_total": "Questions generated by the LLM.",
+    "question_bank_served_total": "Questions served from a prebuilt question bank.",
+    "errors_total": "Pipeline stages that raised an exception.",
+    "cache_hits_total": "Cache lookups answered from the cache.",
+    "cache_misses_total": "Cache lookups that had to compute the value.",
+    "retrieval_duplicate_chars_total": "Characters of retrieved context repeated across chunks.",
+    "llm_cancelled_total": "LLM requests cancelled before they finished.",
+    "chunks_total": "Chunks added to the vector store.",
+    "documents_processed_total": "Documents processed.",
+    "llm_queue_depth": "LLM requests waiting for a free slot.",
+    "stage_seconds": "Time spent in each pipeline stage.",
+}
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+class Trace:
+    """One user-visible operation (an upload, a question) and its timed stages."""
+
+    def __init__(self, name: str, **attrs):
+        self.id = uuid.uuid4().hex[:12]
+        self.name = name
+        self.attrs = attrs
+        self.started_at = time.time()
+        self.duration = None
+        self.spans: List[Dict] = []
+        self.error = None
+        self._start = time.perf_counter()
+
+    def add_span(self, name: str, start: float, duration: float, **attrs):
+        self.spans.append({
+            "name": name,
+            "start_ms": round((start - self._start) * 1000, 2),
+            "duration_ms": round(duration * 1000, 2),
+            **attrs
+        })
+
+    def stage_latency(self) -> Dict[str, float]:
+        """Total milliseconds per stage name."""
+        totals = defaultdict(float)
+        for span in self.spans:
+            totals[span["name"]] += span["duration_ms"]
+        return dict(totals)
+
+    def to_dict(self) -> Dict:
+        return {
+            "trace_id": self.id,
+            "name": self.name,
+            "started_at": self.started_at,
+            "duration_ms": round((self.duration or 0) * 1000, 2),
+            "error": self.error,
+            "attrs": self.attrs,
+            "spans": self.spans
+        }
+
+
+class Telemetry:
+    """Process-wide spans, counters and gauges with Prometheus and JSONL export.
+
+    ``trace`` opens a root operation for the current context; ``span`` times a
+    pipeline stage and attaches it to the open trace, if any. Every span also
+    feeds a per-stage latency summary so stages are visible in Prometheus even
+    when they run outside a trace (e.g. during warm-up).
+    """
+
+    def __init__(self, max_traces: int = TELEMETRY_MAX_TRACES, trace_file=TELEMETRY_TRACE_FILE,
+                 trace_max_bytes: int = TELEMETRY_TRACE_MAX_BYTES):
+        self.logger = logging.getLogger(__name__)
+        self.traces = deque(maxlen=max_traces)
+        self.trace_file = trace_file
+        self.trace_max_bytes = trace_max_bytes
+        self._trace_file_lock = threading.Lock()
+        self.counters: Dict[tuple, float] = defaultdict(float)
+        self.stage_sum: Dict[str, float] = defaultdict(float)
+        self.stage_count: Dict[str, int] = defaultdict(int)
+        self.gauges: Dict[str, Callable[[], float]] = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    @contextmanager
+    def trace(self, name: str, **attrs):
+        """Record a root operation; nested ``span`` calls are attached to it."""
+        trace = Trace(name, **attrs)
+        token = _current_trace.set(trace)
+        try:
+            yield trace
+        except Exception as e:
+            trace.error = str(e)
+            raise
+        finally:
+            _current_trace.reset(token)
+            trace.duration = time.perf_counter() - trace._start
+            with self._lock:
+                self.traces.append(trace)
+            self._write_trace(trace)
+
+    @contextmanager
+    def span(self, name: str, **attrs):
+        """Time one pipeline stage."""
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.incr("errors_total", stage=name)
+            raise
+        finally:
+            self.record(name, time.perf_counter() - start, start=start, **attrs)
+
+    def record(self, name: str, duration: float, start: Optional[float] = None, **attrs):
+        """Add an already-measured stage (e.g. timings reported by an LLM backend)."""
+        with self._lock:
+            self.stage_sum[name] += duration
+            self.stage_count[name] += 1
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add_span(name, start if start is not None else time.perf_counter() - duration,
+                           duration, **attrs)
+
+    def incr(self, name: str, value: float = 1, **labels):
+        """Increase a counter, e.g. ``incr("tokens_total", 42, task="qa")``."""
+        with self._lock:
+            self.counters[(name, tuple(sorted(labels.items())))] += value
+
+    def register_gauge(self, name: str, fn: Callable[[], float]):
+        """Expose a value read at scrape time, e.g. an LLM queue depth."""
+        self.gauges[name] = fn
+
+    def recent_traces(self, n: int = TELEMETRY_MAX_TRACES) -> List[Trace]:
+        with self._lock:
+            return list(self.traces)[-n:]
+
+    def _write_trace(self, trace: Trace):
+        if not self.trace_file:
+            return
+        try:
+            ensure_data_dirs()
+            with self._trace_file_lock:
+                # Keep at most one full old file next to the current one.
+                size = os.path.getsize(self.trace_file) if os.path.exists(self.trace_file) else 0
+                if self.trace_max_bytes and size >= self.trace_max_bytes:
+                    os.replace(self.trace_file, f"{self.trace_file}.1")
+                with open(self.trace_file, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(trace.to_dict()) + "\n")
+        except OSError as e:
+            self.logger.warning(f"Could not write trace file: {e}")
+
+    def prometheus_text(self) -> str:
+        """Render all metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            counters = dict(self.counters)
+            stages = [(s, self.stage_sum[s], self.stage_count[s]) for s in sorted(self.stage_sum)]
+
+        by_name = defaultdict(list)
+        for (name, labels), value in counters.items():
+            by_name[name].append((labels, value))
+        for name in sorted(by_name):
+            lines.extend(_metric_header(name, "counter"))
+            for labels, value in sorted(by_name[name]):
+                lines.append(f"{METRIC_PREFIX}_{name}{_label_text(labels)} {value}")
+
+        lines.extend(_metric_header("stage_seconds", "summary"))
+        for stage, total, count in stages:
+            labels = _label_text([("stage", stage)])
+            lines.append(f"{METRIC_PREFIX}_stage_seconds_sum{labels} {total:.6f}")
+            lines.append(f"{METRIC_PREFIX}_stage_seconds_count{labels} {count}")
+
+        for name, fn in sorted(self.gauges.items()):
+            try:
+                value = fn()
+            except Exception:
+                continue
+            lines.extend(_metric_header(name, "gauge"))
+            lines.append(f"{METRIC_PREFIX}_{name} {value}")
+
+        return "\n".join(lines) + "\n"
+
+    def start_http_server(self, port: int = TELEMETRY_PROMETHEUS_PORT):
+        """Serve ``/metrics`` on localhost in a daemon thread (once per process)."""
+        if self._server is not None or not port:
+            return
+        telemetry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = telemetry.prometheus_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            self._server = ThreadingHTTPServer(("127.0.0.1", port), MetricsHandler)
+        except OSError as e:
+            self.logger.warning(f"Metrics endpoint not started on port {port}: {e}")
+            return
+        threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+        self.logger.info(f"Prometheus metrics at http://127.0.0.1:{port}/metrics")
+
+
+def _metric_header(name: str, metric_type: str) -> List[str]:
+    help_text = METRIC_HELP.get(name, name.replace("_", " ").capitalize() + ".")
+    help_text = help_text.replace("\\", "\\\\").replace("\n", "\\n")
+    return [f"# HELP {METRIC_PREFIX}_{name} {help_text}", f"# TYPE {METRIC_PREFIX}_{name} {metric_type}"]
+
+
+def _label_text(labels) -> str:
+    """``{k="v",...}`` with values escaped as the exposition format requires."""
+    if not labels:
+        return ""
+    escaped = (
+        (k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for k, v in labels
+    )
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+@lru_cache(maxsize=None)
+def get_telemetry() -> Telemetry:
+    """Return the process-wide telemetry registry."""
+    telemetry = Telemetry()
+    telemetry.start_http_server()
+    return telemetry
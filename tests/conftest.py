@@ -0,0 +1,16 @@
+import sys
+import types
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# The app imports its modules as config.*, helpers.* and src.*. In a flat
+# checkout, where every module sits in the repository root, point those
+# package names at the root so the same imports work in tests.
+for package in ("config", "helpers", "src"):
+    if not (ROOT / package).is_dir() and package not in sys.modules:
+        module = types.ModuleType(package)
+        module.__path__ = [str(ROOT)]
+        sys.modules[package] = module
@@ -0,0 +1,168 @@
+import threading
+import time
+
+import pytest
+
+from helpers.admission import AdmissionBackend, cancel_session, queue_position_callback
+from helpers.llm_backend import FakeBackend
+
+
+class RecordingBackend(FakeBackend):
+    """FakeBackend that records prompts in the order they reach the model."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.started = []
+
+    def submit(self, prompt, **kwargs):
+        self.started.append(prompt)
+        return super().submit(prompt, **kwargs)
+
+
+class FailingBackend(FakeBackend):
+    def _generate(self, prompt, **kwargs):
+        raise ValueError(f"model error for {prompt}")
+
+
+@pytest.fixture
+def make_admission():
+    controllers = []
+
+    def make(backend=None, **kwargs):
+        controller = AdmissionBackend(backend or RecordingBackend(), **kwargs)
+        controllers.append(controller)
+        return controller
+
+    yield make
+    for controller in controllers:
+        controller.shutdown()
+
+
+def _occupy(admission, seconds=0.5):
+    """Submit a request that holds the only slot for about ``seconds``."""
+    admission.backend.token_latency = seconds / 4
+    blocker = admission.submit("blocker", task="evaluation", max_tokens=4)
+    deadline = time.perf_counter() + 2
+    while admission.position(blocker) is not None or "blocker" not in admission.backend.started:
+        assert time.perf_counter() < deadline, "blocker was never dispatched"
+        time.sleep(0.001)
+    return blocker
+
+
+def _finish_all(admission, futures):
+    for future in futures:
+        admission.wait(future, timeout=10)
+    admission.backend.token_latency = 0.0
+
+
+def test_results_match_the_wrapped_backend(make_admission):
+    admission = make_admission(max_concurrent=2)
+    future = admission.submit("same prompt", max_tokens=5)
+
+    assert admission.wait(future, timeout=5) == FakeBackend().generate("same prompt", max_tokens=5)
+    assert future.timings["admission_wait"] >= 0
+
+
+def test_lower_priority_numbers_run_first(make_admission):
+    admission = make_admission(max_concurrent=1)
+    blocker = _occupy(admission)
+    futures = [admission.submit(prompt, task=task, max_tokens=1) for prompt, task in
+               [("summary", "summary"), ("bank", "question_bank"), ("question", "question"), ("qa", "qa")]]
+
+    _finish_all(admission, [blocker] + futures)
+    assert admission.backend.started == ["blocker", "qa", "question", "summary", "bank"]
+
+
+def test_sessions_take_turns_within_a_priority(make_admission):
+    admission = make_admission(max_concurrent=1)
+    blocker = _occupy(admission)
+    futures = [admission.submit(f"a{i}", session_id="a", max_tokens=1) for i in range(3)]
+    futures.append(admission.submit("b0", session_id="b", max_tokens=1))
+
+    assert [admission.position(f) for f in futures] == [1, 3, 4, 2]
+    _finish_all(admission, [blocker] + futures)
+    assert admission.backend.started == ["blocker", "a0", "b0", "a1", "a2"]
+
+
+def test_cancelled_requests_never_reach_the_backend(make_admission):
+    admission = make_admission(max_concurrent=1)
+    blocker = _occupy(admission)
+    dropped = admission.submit("dropped", max_tokens=1)
+    admission.submit("other session", session_id="gone", max_tokens=1)
+    kept = admission.submit("kept", max_tokens=1)
+
+    assert dropped.cancel()
+    assert cancel_session("gone") == 1
+    assert admission.position(kept) == 1
+    _finish_all(admission, [blocker, kept])
+    assert admission.backend.started == ["blocker", "kept"]
+
+
+def test_queue_timeout_is_raised_without_busy_waiting(make_admission):
+    admission = make_admission(max_concurrent=1, queue_timeout=0.2)
+    blocker = _occupy(admission, seconds=1.0)
+    queued = admission.submit("queued", max_tokens=1)
+    calls = []
+
+    start = time.perf_counter()
+    with queue_position_callback(calls.append):
+        with pytest.raises(TimeoutError, match="free model slot"):
+            admission.wait(queued, timeout=5)
+    assert time.perf_counter() - start < 1.5
+    assert len(calls) < 10
+    _finish_all(admission, [blocker])
+
+
+def test_wait_timeout_cancels_the_request(make_admission):
+    admission = make_admission(max_concurrent=1, queue_timeout=0)
+    blocker = _occupy(admission, seconds=1.0)
+    queued = admission.submit("queued", max_tokens=1)
+
+    with pytest.raises(TimeoutError, match="did not finish within 0.3s"):
+        admission.wait(queued, timeout=0.3)
+    assert queued.cancelled()
+    blocker.cancel()
+
+
+def test_backend_errors_propagate(make_admission):
+    admission = make_admission(FailingBackend())
+    future = admission.submit("prompt")
+
+    with pytest.raises(ValueError, match="model error for prompt"):
+        admission.wait(future, timeout=5)
+
+
+def test_concurrency_is_capped(make_admission):
+    running, peak = [0], [0]
+    lock = threading.Lock()
+
+    class CountingBackend(FakeBackend):
+        def _generate(self, prompt, **kwargs):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            try:
+                time.sleep(0.02)
+                return super()._generate(prompt, **kwargs)
+            finally:
+                with lock:
+                    running[0] -= 1
+
+    admission = make_admission(CountingBackend(max_workers=8), max_concurrent=2)
+    futures = [admission.submit(f"p{i}", max_tokens=1) for i in range(10)]
+    for future in futures:
+        admission.wait(future, timeout=5)
+    assert peak[0] == 2
+
+
+def test_task_backends_share_the_queue_and_slots(make_admission):
+    qa_backend = RecordingBackend()
+    admission = make_admission(max_concurrent=1, task_backends={"qa": qa_backend})
+    blocker = _occupy(admission)
+    summary = admission.submit("summary", task="summary", max_tokens=1)
+    answer = admission.submit("answer", task="qa", max_tokens=1)
+
+    assert admission.position(answer) == 1 and admission.position(summary) == 2
+    _finish_all(admission, [blocker, summary, answer])
+    assert qa_backend.started == ["answer"]
+    assert admission.backend.started == ["blocker", "summary"]
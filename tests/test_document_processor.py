@@ -0,0 +1,91 @@
+import io
+
+import pytest
+
+from src import document_processor
+from src.document_processor import DocumentProcessor, _BoundedText
+
+
+class Upload(io.BytesIO):
+    """In-memory stand-in for a Streamlit ``UploadedFile``."""
+
+    def __init__(self, data: bytes, name: str = "notes.txt", size: int = None):
+        super().__init__(data)
+        self.name = name
+        self.size = len(data) if size is None else size
+
+
+class Messages:
+    """Records the ``st.info`` / ``st.warning`` / ``st.error`` calls of the processor."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, kind):
+        return lambda message: self.calls.append((kind, message))
+
+
+@pytest.fixture
+def processor(monkeypatch):
+    messages = Messages()
+    monkeypatch.setattr(document_processor, "st", messages)
+    # Small sample and blocks so a short text crosses many read boundaries
+    monkeypatch.setattr(document_processor, "ENCODING_SAMPLE_BYTES", 16)
+    monkeypatch.setattr(document_processor, "EXTRACTION_BLOCK_SIZE", 5)
+    processor = DocumentProcessor.__new__(DocumentProcessor)  # no models needed for TXT parsing
+    processor.max_file_size = 1024
+    processor.supported_formats = ["txt"]
+    processor.messages = messages
+    return processor
+
+
+def test_utf8_beyond_the_sample_is_decoded_as_utf8(processor):
+    text = "plain ascii start, then Grüße, € and 日本語 at the end"
+    assert processor.extract_text_from_txt(Upload(text.encode("utf-8"))) == text
+    assert processor.messages.calls == []
+
+
+@pytest.mark.parametrize("block_size", [1, 2, 3, 4, 7])
+def test_multibyte_characters_split_across_blocks(processor, monkeypatch, block_size):
+    monkeypatch.setattr(document_processor, "EXTRACTION_BLOCK_SIZE", block_size)
+    text = "€uro ünïcödé 日本語 😀 end"
+    assert processor.extract_text_from_txt(Upload(text.encode("utf-8"))) == text
+
+
+def test_latin1_in_the_sample(processor):
+    text = "café crème brûlée"
+    assert processor.extract_text_from_txt(Upload(text.encode("latin-1"))) == text
+    assert processor.messages.calls == [("info", "Text decoded using latin1 encoding.")]
+
+
+def test_latin1_after_the_sample_falls_back(processor):
+    data = "ascii only in the sample... ".encode() + "naïve façade".encode("latin-1")
+    assert processor.extract_text_from_txt(Upload(data)) == data.decode("latin-1").strip()
+    assert ("info", "Text decoded using latin1 encoding.") in processor.messages.calls
+
+
+def test_text_is_truncated_at_the_ceiling_with_a_warning(processor, monkeypatch):
+    monkeypatch.setattr(_BoundedText.__init__, "__defaults__", (20,))
+    text = "0123456789" * 10
+
+    assert processor.extract_text_from_txt(Upload(text.encode())) == text[:20]
+    assert processor.messages.calls == [("warning", "Document text truncated to the first 20 characters.")]
+
+
+def test_bounded_text_strips_only_the_outside():
+    text = _BoundedText(max_chars=100)
+    for piece in ["\n\n", "  first ", "\n", " last  ", " \n"]:
+        assert text.append(piece)
+
+    assert text.getvalue() == "first \n last"
+    assert not text.truncated
+
+
+def test_payload_size_is_checked_against_the_limit(processor):
+    upload = Upload(b"x" * 2048, size=10)  # declared size understates the payload
+    upload.seek(3)
+
+    result = processor.validate_file(upload)
+    assert not result["valid"] and "size exceeds" in result["message"]
+    assert upload.tell() == 3
+    assert processor.validate_file(Upload(b"x" * 100))["valid"]
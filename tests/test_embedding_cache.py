@@ -0,0 +1,66 @@
+from helpers.embedding_cache import CachedQueryEmbeddings
+
+
+class CountingEmbeddings:
+    """Embedder stand-in that counts the texts it is asked to embed."""
+
+    def __init__(self):
+        self.queries = []
+        self.documents = []
+
+    def embed_query(self, text):
+        self.queries.append(text)
+        return [float(len(text)), 1.0]
+
+    def embed_documents(self, texts):
+        self.documents.extend(texts)
+        return [[float(len(text)), 0.0] for text in texts]
+
+
+def test_repeated_queries_hit_the_cache():
+    model = CountingEmbeddings()
+    embeddings = CachedQueryEmbeddings(model, max_entries=8)
+
+    first = embeddings.embed_query("what is HNSW?")
+    first.append(99.0)  # callers get a copy, never the cached vector
+    assert embeddings.embed_query("what is HNSW?") == [13.0, 1.0]
+    assert embeddings.embed_query("what is HNSW?") == [13.0, 1.0]
+
+    assert model.queries == ["what is HNSW?"]
+    assert (embeddings.hits, embeddings.misses) == (2, 1)
+
+
+def test_least_recently_used_query_is_evicted():
+    model = CountingEmbeddings()
+    embeddings = CachedQueryEmbeddings(model, max_entries=2)
+    embeddings.embed_query("a")
+    embeddings.embed_query("b")
+    embeddings.embed_query("a")  # "b" is now the oldest entry
+    embeddings.embed_query("c")
+
+    embeddings.embed_query("a")
+    embeddings.embed_query("b")
+    assert model.queries == ["a", "b", "c", "b"]
+
+
+def test_documents_bypass_the_cache():
+    model = CountingEmbeddings()
+    embeddings = CachedQueryEmbeddings(model, max_entries=8)
+    embeddings.embed_documents(["chunk one", "chunk two"])
+    embeddings.embed_documents(["chunk one"])
+
+    assert model.documents == ["chunk one", "chunk two", "chunk one"]
+    assert (embeddings.hits, embeddings.misses) == (0, 0)
+
+    embeddings.embed_query("chunk one")
+    assert model.queries == ["chunk one"]
+
+
+def test_clear_empties_the_cache():
+    model = CountingEmbeddings()
+    embeddings = CachedQueryEmbeddings(model, max_entries=8)
+    embeddings.embed_query("a")
+    embeddings.clear()
+    embeddings.embed_query("a")
+
+    assert model.queries == ["a", "a"]
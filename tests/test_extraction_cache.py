@@ -0,0 +1,73 @@
+import io
+import os
+import random
+import string
+
+from src.extraction_cache import EXTRACTOR_VERSIONS, ExtractionCache
+
+
+def _noise(n, seed):
+    """Text that gzip can't shrink much, so entry sizes are predictable."""
+    rng = random.Random(seed)
+    return "".join(rng.choice(string.ascii_letters + string.digits) for _ in range(n))
+
+
+def test_round_trip(tmp_path):
+    cache = ExtractionCache(tmp_path)
+    key = cache.key("abc", "txt")
+    cache.put(key, "Grüße aus dem Cache\n" * 100)
+
+    assert cache.get(key) == "Grüße aus dem Cache\n" * 100
+    assert cache.get(cache.key("other", "txt")) is None
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+
+def test_keys_include_file_type_and_extractor_version(monkeypatch, tmp_path):
+    cache = ExtractionCache(tmp_path)
+    cache.put(cache.key("abc", "pdf"), "pdf text")
+
+    assert cache.key("abc", "pdf") != cache.key("abc", "txt")
+    assert cache.get(cache.key("abc", "txt")) is None
+
+    monkeypatch.setitem(EXTRACTOR_VERSIONS, "pdf", EXTRACTOR_VERSIONS["pdf"] + 1)
+    assert cache.get(cache.key("abc", "pdf")) is None
+
+
+def test_hash_file_resets_the_position():
+    upload = io.BytesIO(b"x" * 3_000_000)
+    upload.seek(10)
+    digest = ExtractionCache.hash_file(upload)
+
+    assert upload.tell() == 0
+    assert digest == ExtractionCache.hash_file(io.BytesIO(b"x" * 3_000_000))
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ExtractionCache(tmp_path, max_bytes=10 ** 9)
+    keys = [cache.key(f"doc{i}", "txt") for i in range(4)]
+    for i, key in enumerate(keys):
+        cache.put(key, _noise(10_000, i))
+        os.utime(cache._path(key), (1000 + i, 1000 + i))
+    assert cache.get(keys[0])  # reading refreshes the oldest entry
+
+    entry_size = os.path.getsize(cache._path(keys[1]))
+    cache.max_bytes = int(entry_size * 3.5)
+    cache.put(cache.key("doc4", "txt"), _noise(10_000, 4))
+
+    remaining = {key for key in keys if os.path.exists(cache._path(key))}
+    assert remaining == {keys[0], keys[3]}
+    assert cache.get(cache.key("doc4", "txt"))
+
+
+def test_corrupted_and_truncated_entries_are_dropped(tmp_path):
+    cache = ExtractionCache(tmp_path)
+    corrupted, truncated = cache.key("bad", "txt"), cache.key("short", "txt")
+    with open(cache._path(corrupted), "wb") as f:
+        f.write(b"not gzip at all")
+    cache.put(truncated, _noise(50_000, 0))
+    with open(cache._path(truncated), "r+b") as f:
+        f.truncate(os.path.getsize(cache._path(truncated)) // 2)
+
+    for key in (corrupted, truncated):
+        assert cache.get(key) is None
+        assert not os.path.exists(cache._path(key))
@@ -0,0 +1,63 @@
+import numpy as np
+
+from src.hnsw_tuner import chunk_queries, choose_config, exact_neighbors, pareto_frontier, recall_at_k
+
+
+# Row 1 is far away but points almost exactly along the query, so l2 and cosine disagree
+CORPUS = np.array([[1.0, 0.0], [10.0, 1.0], [0.0, 1.0], [-1.0, 0.0]])
+QUERIES = np.array([[1.0, 0.2], [0.1, 2.0]])
+
+
+def _result(recall, p95_ms, m):
+    return {"hnsw:M": m, "recall": recall, "p95_ms": p95_ms}
+
+
+RESULTS = [
+    _result(0.80, 1.0, m=4),
+    _result(0.95, 2.0, m=8),
+    _result(0.90, 2.5, m=12),  # slower and less accurate than M=8
+    _result(0.95, 2.0, m=16),  # ties M=8 on both
+    _result(0.99, 2.0, m=24),  # as fast as M=8, more accurate
+    _result(1.00, 4.0, m=32),
+]
+
+
+def test_exact_neighbors_l2_and_cosine():
+    assert exact_neighbors(CORPUS, QUERIES, k=3, space="l2").tolist() == [[0, 2, 3], [2, 0, 3]]
+    assert exact_neighbors(CORPUS, QUERIES, k=3, space="cosine").tolist() == [[1, 0, 2], [2, 1, 0]]
+
+
+def test_exact_neighbors_caps_k_at_the_corpus_size():
+    assert exact_neighbors(CORPUS, QUERIES, k=10, space="l2").shape == (2, 4)
+
+
+def test_recall_at_k_ignores_order():
+    exact = np.array([[0, 1, 2], [3, 4, 5]])
+
+    assert recall_at_k(np.array([[2, 1, 0], [5, 4, 3]]), exact) == 1.0
+    assert recall_at_k(np.array([[0, 9, 9], [3, 4, 9]]), exact) == 0.5
+    assert recall_at_k(np.array([[7, 8, 9], [6, 7, 8]]), exact) == 0.0
+
+
+def test_pareto_frontier_drops_dominated_configs():
+    assert [r["hnsw:M"] for r in pareto_frontier(RESULTS)] == [4, 24, 32]
+
+
+def test_choose_config_prefers_the_fastest_config_reaching_the_target():
+    assert choose_config(RESULTS, target_recall=0.9)["hnsw:M"] == 24  # the p95 tie goes to recall
+    assert choose_config(RESULTS, target_recall=0.8)["hnsw:M"] == 4
+    assert choose_config(RESULTS, target_recall=1.0)["hnsw:M"] == 32
+
+
+def test_choose_config_falls_back_to_the_most_accurate():
+    results = [_result(0.7, 3.0, m=4), _result(0.8, 5.0, m=8), _result(0.8, 2.0, m=16)]
+    assert choose_config(results, target_recall=0.95)["hnsw:M"] == 16
+
+
+def test_chunk_queries_hold_out_chunks_and_use_their_longest_sentence():
+    chunks = [f"Short {i}. The longest sentence of chunk {i}. Tail." for i in range(10)]
+    held_out, queries = chunk_queries(chunks, n_queries=8, seed=1)
+
+    assert len(held_out) == 5 and held_out == sorted(held_out)
+    assert queries == [f"The longest sentence of chunk {i}." for i in held_out]
+    assert chunk_queries(chunks, n_queries=8, seed=1) == (held_out, queries)
@@ -0,0 +1,44 @@
+import pytest
+
+from helpers.langchain_helper import LangChainHelper
+
+
+def _evaluation(score=7, feedback="", strengths=(), improvements=()):
+    return {"score": score, "feedback": feedback, "strengths": list(strengths), "improvements": list(improvements)}
+
+
+@pytest.mark.parametrize("text, expected", [
+    # JSON from grammar-constrained backends, optionally wrapped in prose
+    ('{"score": 8, "feedback": "Good.", "strengths": ["clear"], "improvements": ["cite"]}',
+     _evaluation(8, "Good.", ["clear"], ["cite"])),
+    ('Here is my evaluation:\n{"score": 6, "feedback": "Partly right."}\nThanks!',
+     _evaluation(6, "Partly right.")),
+    # Out-of-range scores are clamped
+    ('{"score": 14}', _evaluation(10)),
+    ('{"score": -3}', _evaluation(0)),
+    # Missing fields get defaults, non-string items are stringified
+    ('{}', _evaluation()),
+    ('{"strengths": [1, "two"]}', _evaluation(strengths=["1", "two"])),
+])
+def test_json_evaluations(text, expected):
+    assert LangChainHelper.__new__(LangChainHelper)._parse_evaluation(text) == expected
+
+
+@pytest.mark.parametrize("text, score", [
+    ("Score: 8/10\nWell argued.", 8),
+    ("The answer is vague.\nRating: 12", 10),
+    ("No numbers anywhere.", 7),
+    # Malformed or ill-typed JSON falls back to the free-text parser
+    ('{"score": 9, "feedback": "cut off', 9),
+    ('{"score": "high"}', 7),
+    ('{"score": 5, "strengths": 3}', 5),
+])
+def test_free_text_fallback(text, score):
+    result = LangChainHelper.__new__(LangChainHelper)._parse_evaluation(text)
+
+    assert result == _evaluation(score, text[:200])
+
+
+def test_fallback_feedback_is_truncated():
+    text = "Score 4. " + "x" * 500
+    assert LangChainHelper.__new__(LangChainHelper)._parse_evaluation(text)["feedback"] == text[:200]
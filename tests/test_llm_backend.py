@@ -0,0 +1,83 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from helpers.llm_backend import (
+    LLMBackend, FakeBackend, create_llm_backend, stream_completion, _submit_timed
+)
+
+
+class StreamingModel:
+    """Stand-in for ``llama_cpp.Llama``: streams one word per chunk after a prompt delay."""
+
+    def create_completion(self, prompt, grammar=None, stream=False, **kwargs):
+        time.sleep(0.05)
+        for word in ["The ", "answer ", "is ", "four."]:
+            yield {"choices": [{"text": word}]}
+            time.sleep(0.01)
+
+    def tokenize(self, data, add_bos=False):
+        return data.split()
+
+
+def test_backend_interface_is_abstract():
+    with pytest.raises(TypeError):
+        LLMBackend()
+
+
+def test_fake_backend_is_deterministic():
+    backend = FakeBackend()
+    first = backend.generate("What is MMR?", max_tokens=5)
+
+    assert first == FakeBackend().generate("What is MMR?", max_tokens=5)
+    assert first != backend.generate("What is HNSW?", max_tokens=5)
+    assert len(first.split()) == 5
+    assert backend.generated_tokens == 10
+    backend.shutdown()
+
+
+def test_fake_backend_fills_json_schemas():
+    schema = {
+        "type": "object",
+        "properties": {
+            "score": {"type": "integer", "minimum": 1, "maximum": 10},
+            "strengths": {"type": "array", "items": {"type": "string"}}
+        }
+    }
+    backend = create_llm_backend("fake")
+    result = json.loads(backend.generate("evaluate", json_schema=json.dumps(schema)))
+
+    assert 1 <= result["score"] <= 10
+    assert isinstance(result["strengths"][0], str)
+    backend.shutdown()
+
+
+def test_fake_backend_applies_stop_sequences():
+    backend = FakeBackend()
+    full = backend.generate("prompt", max_tokens=3)
+    stop = full.split()[1]
+
+    assert backend.generate("prompt", max_tokens=3, stop=[stop]) == full[:full.find(stop)]
+    backend.shutdown()
+
+
+def test_streamed_completions_report_prompt_eval_and_generate():
+    text, n_tokens, timings = stream_completion(StreamingModel(), "Question: 2 + 2?")
+
+    assert (text, n_tokens) == ("The answer is four.", 4)
+    assert timings["prompt_eval"] >= 0.04
+    assert 0.02 <= timings["generate"] < timings["prompt_eval"]
+
+
+def test_timed_futures_carry_timings_with_their_result():
+    executor = ThreadPoolExecutor(max_workers=1)
+    future = _submit_timed(executor, lambda prompt: (prompt.upper(), {"prompt_eval": 0.1}), "hi")
+
+    assert future.result(timeout=5) == "HI"
+    assert future.timings == {"prompt_eval": 0.1}
+    failed = _submit_timed(executor, lambda: 1 / 0)
+    with pytest.raises(ZeroDivisionError):
+        failed.result(timeout=5)
+    executor.shutdown()
@@ -0,0 +1,53 @@
+import os
+
+from helpers import profiler
+from helpers.profiler import SamplingProfiler, _prune
+
+
+def _old_profiles(directory, n):
+    """``n`` profile files with mtimes one minute apart, oldest first."""
+    names = []
+    for i in range(n):
+        name = f"old{i}.folded"
+        (directory / name).write_text(f"main;work {i}\n")
+        os.utime(directory / name, (1_000_000 + 60 * i, 1_000_000 + 60 * i))
+        names.append(name)
+    return names
+
+
+def test_prune_keeps_the_newest_files(tmp_path):
+    names = _old_profiles(tmp_path, 6)
+    _prune(tmp_path, max_files=4)
+
+    assert sorted(os.listdir(tmp_path)) == names[2:]
+
+
+def test_prune_without_a_limit_keeps_everything(tmp_path):
+    names = _old_profiles(tmp_path, 3)
+    _prune(tmp_path, max_files=0)
+    _prune(tmp_path, max_files=5)
+
+    assert sorted(os.listdir(tmp_path)) == names
+
+
+def test_save_prunes_past_the_cap(tmp_path, monkeypatch):
+    monkeypatch.setattr(_prune, "__defaults__", (3,))
+    names = _old_profiles(tmp_path, 5)
+    sampler = SamplingProfiler("answer_question")
+    sampler.samples["main;answer_question;generate"] = 4
+
+    path = sampler.save(tmp_path, fmt="collapsed")
+
+    assert sorted(os.listdir(tmp_path)) == sorted(names[3:] + [os.path.basename(path)])
+    with open(path, encoding="utf-8") as f:
+        assert f.read() == "main;answer_question;generate 4\n"
+
+
+def test_sections_are_not_profiled_unless_enabled(monkeypatch):
+    monkeypatch.setattr(profiler, "PROFILING_ENABLED", False)
+
+    @profiler.profiled("quiz")
+    def work():
+        return profiler._active_profiler.get()
+
+    assert work() is None
@@ -0,0 +1,114 @@
+import logging
+import random
+
+from config.settings import QUESTION_TYPES
+from helpers.langchain_helper import LangChainHelper
+from helpers.llm_backend import FakeBackend
+from helpers.prompt_pipeline import compile_prompts
+from src.question_bank import QuestionBank
+
+
+DIFFICULTIES = ["Easy", "Medium", "Hard"]
+
+
+class FakeQuestionHelper:
+    """Question generator on FakeBackend: one question of every type per call."""
+
+    def __init__(self, fail=False):
+        self.backend = FakeBackend()
+        self.fail = fail
+        self.calls = 0
+
+    def generate_questions(self, context, question_type="mixed", task="question", raise_errors=False):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError("model unavailable")
+        return [{
+            "type": q_type,
+            "question": self.backend.generate(f"{q_type}: {context}", max_tokens=4) + "?",
+            "difficulty": DIFFICULTIES[i % len(DIFFICULTIES)]
+        } for i, q_type in enumerate(QUESTION_TYPES)]
+
+
+class FailingBackend(FakeBackend):
+    def _generate(self, prompt, **kwargs):
+        raise TimeoutError("Waited more than 120s for a free model slot.")
+
+
+def _langchain_helper(backend):
+    """The real helper on ``backend``, without loading the model or the embedder."""
+    helper = LangChainHelper.__new__(LangChainHelper)
+    helper.logger = logging.getLogger(__name__)
+    helper.backend = backend
+    helper.prompts = compile_prompts(backend.count_tokens)
+    return helper
+
+
+def _build(bank, key, n_chunks=12):
+    future = bank.build_async(key, [f"chunk {i} text" for i in range(n_chunks)])
+    if future is not None:
+        future.result(timeout=10)
+
+
+def test_sections_are_spread_over_the_document():
+    assert QuestionBank.select_sections(12, sections=3, width=2) == [[0, 1], [5, 6], [10, 11]]
+    assert QuestionBank.select_sections(3, sections=6, width=2) == [[0, 1], [1, 2]]
+    assert QuestionBank.select_sections(1, sections=6, width=2) == [[0]]
+    assert QuestionBank.select_sections(0) == []
+
+
+def test_build_stores_questions_with_their_sources():
+    helper = FakeQuestionHelper()
+    bank = QuestionBank(helper)
+    _build(bank, "hash-a")
+
+    done, total, n_questions = bank.progress("hash-a")
+    assert bank.status("hash-a") == "ready"
+    assert done == total == helper.calls
+    assert n_questions == total * len(QUESTION_TYPES)
+    assert all(q["chunk_ids"] for q in bank.sample("hash-a", n=n_questions))
+
+
+def test_sample_covers_types_and_filters_difficulty():
+    bank = QuestionBank(FakeQuestionHelper())
+    _build(bank, "hash-a")
+
+    picked = bank.sample("hash-a", n=len(QUESTION_TYPES), rng=random.Random(0))
+    assert sorted(q["type"] for q in picked) == sorted(QUESTION_TYPES)
+    assert len({q["question"] for q in picked}) == len(picked)
+
+    hard = bank.sample("hash-a", difficulty="Hard", n=50)
+    assert hard and all(q["difficulty"] == "Hard" for q in hard)
+    assert bank.sample("unknown") == []
+
+
+def test_existing_banks_are_reused_and_failed_ones_rebuilt():
+    helper = FakeQuestionHelper(fail=True)
+    bank = QuestionBank(helper)
+    _build(bank, "hash-a")
+    assert bank.status("hash-a") == "failed"
+
+    helper.fail = False
+    _build(bank, "hash-a")
+    calls = helper.calls
+    assert bank.status("hash-a") == "ready"
+
+    assert bank.build_async("hash-a", ["other chunks"]) is None
+    assert helper.calls == calls
+    assert bank.status("hash-b") == "missing"
+
+
+def test_llm_failures_fail_the_build_and_are_retried():
+    helper = _langchain_helper(FailingBackend())
+    bank = QuestionBank(helper)
+    _build(bank, "hash-a")
+    assert bank.status("hash-a") == "failed"
+    assert bank.progress("hash-a")[2] == 0
+
+    # On-demand generation still degrades to no questions instead of raising.
+    assert helper.generate_questions("some context") == []
+
+    helper.backend = FakeBackend()
+    _build(bank, "hash-a")
+    assert bank.status("hash-a") == "ready"
+    assert bank.progress("hash-a")[2] > 0
@@ -0,0 +1,69 @@
+import json
+
+from helpers.telemetry import METRIC_PREFIX, Telemetry
+
+
+def _telemetry(tmp_path, **kwargs):
+    return Telemetry(trace_file=str(tmp_path / "traces.jsonl"), **kwargs)
+
+
+def test_prometheus_text_declares_every_metric(tmp_path):
+    telemetry = _telemetry(tmp_path)
+    telemetry.incr("tokens_total", 42, task="qa")
+    telemetry.incr("tokens_total", 8, task="evaluation")
+    telemetry.incr("documents_processed_total")
+    telemetry.record("retrieval", 0.25)
+    telemetry.register_gauge("llm_queue_depth", lambda: 3)
+    lines = telemetry.prometheus_text().splitlines()
+
+    for name, metric_type in [("tokens_total", "counter"), ("documents_processed_total", "counter"),
+                              ("stage_seconds", "summary"), ("llm_queue_depth", "gauge")]:
+        help_line = lines.index(f"# TYPE {METRIC_PREFIX}_{name} {metric_type}") - 1
+        assert lines[help_line].startswith(f"# HELP {METRIC_PREFIX}_{name} ")
+
+    assert f'{METRIC_PREFIX}_tokens_total{{task="qa"}} 42.0' in lines
+    assert f"{METRIC_PREFIX}_documents_processed_total 1.0" in lines
+    assert f'{METRIC_PREFIX}_stage_seconds_sum{{stage="retrieval"}} 0.250000' in lines
+    assert f'{METRIC_PREFIX}_stage_seconds_count{{stage="retrieval"}} 1' in lines
+    assert f"{METRIC_PREFIX}_llm_queue_depth 3" in lines
+
+
+def test_label_values_are_escaped(tmp_path):
+    telemetry = _telemetry(tmp_path)
+    telemetry.incr("errors_total", stage='say "hi"\\n\nnext')
+
+    assert telemetry.prometheus_text().splitlines()[2] == (
+        f'{METRIC_PREFIX}_errors_total{{stage="say \\"hi\\"\\\\n\\nnext"}} 1.0'
+    )
+
+
+def test_failing_gauges_are_skipped(tmp_path):
+    telemetry = _telemetry(tmp_path)
+    telemetry.register_gauge("llm_queue_depth", lambda: 1 / 0)
+
+    assert "llm_queue_depth" not in telemetry.prometheus_text()
+
+
+def test_trace_file_rotates_at_the_size_limit(tmp_path):
+    telemetry = _telemetry(tmp_path, trace_max_bytes=500)
+    current, old = tmp_path / "traces.jsonl", tmp_path / "traces.jsonl.1"
+
+    names = []
+    while not old.exists():
+        names.append(f"question-{len(names)}")
+        with telemetry.trace(names[-1]):
+            pass
+
+    old_names = [json.loads(line)["name"] for line in old.read_text(encoding="utf-8").splitlines()]
+    assert old.stat().st_size >= 500
+    assert old_names == names[:-1]
+    assert [json.loads(line)["name"] for line in current.read_text(encoding="utf-8").splitlines()] == names[-1:]
+
+    # Only one old file is kept
+    while current.stat().st_size < 500:
+        with telemetry.trace("more"):
+            pass
+    with telemetry.trace("last"):
+        pass
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["traces.jsonl", "traces.jsonl.1"]
+    assert json.loads(old.read_text(encoding="utf-8").splitlines()[0])["name"] == names[-1]
@@ -0,0 +1,75 @@
+import re
+
+import pytest
+
+from src import text_chunker
+from src.text_chunker import TokenTextChunker
+
+
+class WordTokenizer:
+    """Tokenizer stand-in with the fast-tokenizer call signature: one token per word."""
+
+    def __call__(self, texts, add_special_tokens=False, return_attention_mask=False,
+                 return_token_type_ids=False, return_offsets_mapping=False):
+        if isinstance(texts, str):
+            offsets = [m.span() for m in re.finditer(r"\S+", texts)]
+            result = {"input_ids": list(range(len(offsets)))}
+            if return_offsets_mapping:
+                result["offset_mapping"] = offsets
+            return result
+        return {"input_ids": [text.split() for text in texts]}
+
+
+@pytest.fixture
+def make_chunker(monkeypatch):
+    monkeypatch.setattr(text_chunker, "load_tokenizer", lambda name: WordTokenizer())
+    return lambda size, overlap: TokenTextChunker(chunk_size=size, chunk_overlap=overlap)
+
+
+def _sentences(n, words=5, start=0):
+    return [" ".join(f"s{i}w{j}" for j in range(words)) + "." for i in range(start, start + n)]
+
+
+def test_spans_index_the_chunks(make_chunker):
+    chunker = make_chunker(20, 5)
+    text = " ".join(_sentences(12))
+    spans = chunker.split_spans(text)
+
+    assert chunker.split_text(text) == [text[start:end] for start, end in spans]
+    assert spans[0][0] == 0 and spans[-1][1] == len(text)
+
+
+def test_chunks_fit_and_overlap_by_whole_sentences(make_chunker):
+    chunker = make_chunker(20, 5)
+    text = " ".join(_sentences(12))
+    spans = chunker.split_spans(text)
+
+    for start, end in spans:
+        assert len(text[start:end].split()) <= 20
+        assert text[start:end].endswith(".")
+    for (_, first_end), (second_start, _) in zip(spans, spans[1:]):
+        overlap = text[second_start:first_end]
+        assert second_start < first_end
+        assert len(overlap.split()) <= 5 and overlap.endswith(".")
+
+
+def test_chunks_break_at_sections_without_overlap(make_chunker):
+    chunker = make_chunker(20, 5)
+    first, second = " ".join(_sentences(3)), " ".join(_sentences(3, start=3))
+    text = first + "\n\n" + second
+
+    assert chunker.split_text(text) == [first, second]
+
+
+def test_long_sentences_are_cut_on_token_offsets(make_chunker):
+    chunker = make_chunker(10, 2)
+    text = " ".join(f"w{i}" for i in range(25)) + "."
+    chunks = chunker.split_text(text)
+
+    assert [len(chunk.split()) for chunk in chunks] == [10, 10, 5]
+    assert " ".join(chunks) == text
+
+
+def test_overlap_must_be_smaller_than_chunk_size(make_chunker):
+    with pytest.raises(ValueError):
+        make_chunker(10, 10)
@@ -0,0 +1,71 @@
+import numpy as np
+from langchain_core.documents import Document
+
+from src.vector_store import duplicate_chars, maximal_marginal_relevance, merge_adjacent_chunks
+
+
+TEXT = "Alpha beta gamma. Delta epsilon zeta. Short one. Eta theta iota kappa. Lambda mu nu."
+
+
+def _chunk(doc_id, chunk_id, start, end, offsets=True):
+    metadata = {"doc_id": doc_id, "chunk_id": chunk_id, "filename": "paper.pdf"}
+    if offsets:
+        metadata.update(start_char=start, end_char=end)
+    return Document(page_content=TEXT[start:end], metadata=metadata)
+
+
+def test_mmr_starts_with_the_most_relevant_candidate():
+    query = np.array([1.0, 0.0])
+    candidates = np.array([[0.6, 0.8], [1.0, 0.05], [0.9, 0.1]])
+
+    assert maximal_marginal_relevance(query, candidates, k=1)[0] == 1
+
+
+def test_mmr_trades_relevance_for_diversity():
+    query = np.array([1.0, 0.0, 0.0])
+    candidates = np.array([[1.0, 0.0, 0.0], [0.99, 0.01, 0.0], [0.7, 0.0, 0.7]])
+
+    assert maximal_marginal_relevance(query, candidates, k=2, lambda_mult=1.0) == [0, 1]
+    assert maximal_marginal_relevance(query, candidates, k=2, lambda_mult=0.3) == [0, 2]
+    assert sorted(maximal_marginal_relevance(query, candidates, k=5)) == [0, 1, 2]
+    assert maximal_marginal_relevance(query, candidates[:0], k=3) == []
+
+
+def test_neighbours_are_joined_on_offsets_even_for_short_overlaps():
+    # "Short one. " (11 chars) is shared by both chunks
+    first, second = _chunk("doc_a", 0, 0, 49), _chunk("doc_a", 1, 38, len(TEXT))
+    spans, removed = merge_adjacent_chunks([second, first])
+
+    assert len(spans) == 1
+    assert spans[0].page_content == TEXT
+    assert spans[0].metadata["chunk_ids"] == [0, 1]
+    assert removed == 11
+
+
+def test_chunks_of_different_uploads_are_not_joined():
+    spans, removed = merge_adjacent_chunks([_chunk("doc_a", 0, 0, 38), _chunk("doc_b", 1, 38, 49)])
+
+    assert [span.page_content for span in spans] == [TEXT[0:38], TEXT[38:49]]
+    assert removed == 0
+
+
+def test_chunks_without_offsets_are_kept_as_they_are():
+    docs = [_chunk("doc_a", 0, 0, 38, offsets=False), _chunk("doc_a", 1, 38, 49, offsets=False)]
+    spans, removed = merge_adjacent_chunks(docs)
+
+    assert spans == docs
+    assert removed == 0
+
+
+def test_runs_keep_the_rank_of_their_best_chunk():
+    docs = [_chunk("doc_a", 2, 49, 71), _chunk("doc_b", 0, 0, 17), _chunk("doc_a", 1, 38, 49),
+            _chunk("doc_a", 2, 49, 71)]
+    spans, removed = merge_adjacent_chunks(docs)
+
+    assert [span.metadata.get("chunk_ids") for span in spans] == [[1, 2], [0]]
+    assert spans[0].page_content == TEXT[38:71]
+    assert removed == 71 - 49  # the same chunk retrieved twice
+
+
+def test_duplicate_chars_counts_repeated_sentences():
+    assert duplicate_chars(["One. Two.", "Two. Three."]) == len("Two.")
@@ -0,0 +1,145 @@
+import re
+from functools import lru_cache
+from typing import List, Tuple
+
+import numpy as np
+
+from config.settings import CHUNK_TOKENIZER, CHUNK_SIZE_TOKENS, CHUNK_OVERLAP_TOKENS
+
+
+# Sentence ends (".", "!", "?") followed by whitespace, or a blank line
+# that starts a new section / page.
+_BOUNDARY_RE = re.compile(r"\n[ \t]*\n\s*|(?<=[.!?])\s+")
+
+
+@lru_cache(maxsize=None)
+def load_tokenizer(name: str = CHUNK_TOKENIZER):
+    """Load (once per process) the fast tokenizer used to measure chunks."""
+    from transformers import AutoTokenizer
+
+    return AutoTokenizer.from_pretrained(name, use_fast=True)
+
+
+class TokenTextChunker:
+    """Sentence-aware text chunker that measures length in tokenizer tokens.
+
+    The whole document is segmented into sentences in one regex pass, all
+    sentences are tokenized in a single batched call, and chunk boundaries
+    are found with a cumulative token count instead of recursive re-splitting.
+    """
+
+    def __init__(self, chunk_size: int = CHUNK_SIZE_TOKENS,
+                 chunk_overlap: int = CHUNK_OVERLAP_TOKENS,
+                 tokenizer_name: str = CHUNK_TOKENIZER):
+        if chunk_overlap >= chunk_size:
+            raise ValueError("chunk_overlap must be smaller than chunk_size")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.tokenizer = load_tokenizer(tokenizer_name)
+
+    def count_tokens(self, texts: List[str], add_special_tokens: bool = False) -> np.ndarray:
+        """Return the token count of each text using one batched tokenizer call."""
+        if not texts:
+            return np.zeros(0, dtype=np.int64)
+        encoded = self.tokenizer(
+            texts,
+            add_special_tokens=add_special_tokens,
+            return_attention_mask=False,
+            return_token_type_ids=False
+        )["input_ids"]
+        return np.fromiter((len(ids) for ids in encoded), dtype=np.int64, count=len(encoded))
+
+    def _segment(self, text: str) -> Tuple[List[Tuple[int, int]], List[bool]]:
+        """Split text into sentence spans and flag spans that open a section."""
+        spans = []
+        section_starts = []
+        start = 0
+        new_section = True
+
+        for match in _BOUNDARY_RE.finditer(text):
+            if match.start() > start:
+                spans.append((start, match.start()))
+                section_starts.append(new_section)
+                new_section = False
+            if "\n" in match.group():
+                new_section = True
+            start = match.end()
+
+        if start < len(text):
+            spans.append((start, len(text)))
+            section_starts.append(new_section)
+
+        return spans, section_starts
+
+    def _split_long_span(self, text: str, span: Tuple[int, int]) -> List[Tuple[int, int]]:
+        """Cut a single sentence that exceeds the chunk size at token offsets."""
+        offsets = self.tokenizer(
+            text[span[0]:span[1]],
+            add_special_tokens=False,
+            return_offsets_mapping=True
+        )["offset_mapping"]
+
+        pieces = []
+        for i in range(0, len(offsets), self.chunk_size):
+            window = offsets[i:i + self.chunk_size]
+            pieces.append((span[0] + window[0][0], span[0] + window[-1][1]))
+        return pieces
+
+    def split_text(self, text: str) -> List[str]:
+        """Split text into chunks of at most ``chunk_size`` tokens."""
+        return [text[start:end] for start, end in self.split_spans(text)]
+
+    def split_spans(self, text: str) -> List[Tuple[int, int]]:
+        """Like ``split_text``, but return each chunk's (start, end) character offsets in ``text``."""
+        spans, section_starts = self._segment(text)
+        if not spans:
+            return []
+
+        lengths = self.count_tokens([text[s:e] for s, e in spans])
+
+        # Rare path: sentences longer than a whole chunk are cut on token offsets.
+        if (lengths > self.chunk_size).any():
+            new_spans, new_sections = [], []
+            for span, is_section, length in zip(spans, section_starts, lengths):
+                if length <= self.chunk_size:
+                    new_spans.append(span)
+                    new_sections.append(is_section)
+                    continue
+                pieces = self._split_long_span(text, span)
+                new_spans.extend(pieces)
+                new_sections.extend([is_section] + [False] * (len(pieces) - 1))
+            spans, section_starts = new_spans, new_sections
+            lengths = self.count_tokens([text[s:e] for s, e in spans])
+
+        # cumulative[i] is the token count of spans[:i]
+        cumulative = np.concatenate(([0], np.cumsum(lengths)))
+        section_idx = np.flatnonzero(section_starts)
+        n_spans = len(spans)
+
+        bounds = []
+        start = 0
+        while start < n_spans:
+            # Furthest span end that keeps the chunk within budget.
+            end = int(np.searchsorted(cumulative, cumulative[start] + self.chunk_size, side="right")) - 1
+            end = max(end, start + 1)
+
+            # Prefer to stop at a section boundary if it keeps the chunk at least half full.
+            if end < n_spans:
+                lo = np.searchsorted(section_idx, start + 1)
+                hi = np.searchsorted(section_idx, end, side="right")
+                if hi > lo:
+                    boundary = int(section_idx[hi - 1])
+                    if cumulative[boundary] - cumulative[start] >= self.chunk_size // 2:
+                        end = boundary
+
+            bounds.append((spans[start][0], spans[end - 1][1]))
+            if end >= n_spans:
+                break
+
+            # Carry whole trailing sentences as overlap, but never restart on a new section.
+            next_start = int(np.searchsorted(cumulative, cumulative[end] - self.chunk_overlap, side="left"))
+            if section_starts[end]:
+                next_start = end
+            start = min(max(next_start, start + 1), end)
+
+        return bounds
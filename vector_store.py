@@ -1,21 +1,136 @@
-import chromadb
-from chromadb.config import Settings
-from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from typing import List, Dict, Any
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Tuple
+import logging
 import os
-from config.settings import VECTORSTORE_PERSIST_DIR, COLLECTION_NAME, EMBEDDING_MODEL
+import re
+import uuid
+
+import numpy as np
+
+from config.settings import VECTORSTORE_PERSIST_DIR, COLLECTION_NAME, HNSW_PARAMS
+from config.settings import RETRIEVAL_MODE, MMR_FETCH_K, MMR_LAMBDA
+from helpers.telemetry import get_telemetry
+
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+|\n\s*\n")
+
+
+def maximal_marginal_relevance(query: np.ndarray, candidates: np.ndarray, k: int,
+                               lambda_mult: float = MMR_LAMBDA) -> List[int]:
+    """Indices of ``k`` candidates picked greedily by maximal marginal relevance.
+
+    Query and pairwise cosine similarities are computed once as matrices;
+    each step only folds the newest pick into every candidate's maximum
+    similarity to the selected set, so there are no per-pair Python loops.
+    """
+    n = min(k, len(candidates))
+    if n == 0:
+        return []
+    candidates = candidates / np.linalg.norm(candidates, axis=1, keepdims=True)
+    relevance = candidates @ (query / np.linalg.norm(query))
+    similarity = candidates @ candidates.T
+
+    selected = [int(np.argmax(relevance))]
+    redundancy = similarity[selected[0]].copy()
+    while len(selected) < n:
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[selected] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        np.maximum(redundancy, similarity[best], out=redundancy)
+    return selected
+
+
+def _stitch(first: str, first_end: int, second: str, second_start: int) -> Tuple[str, int]:
+    """Join two neighbouring chunks by their character offsets in the document.
+
+    ``first`` ends at ``first_end`` and ``second`` starts at ``second_start``;
+    the text they share is dropped from ``second``, and chunks separated by a
+    gap (e.g. a section break) are joined with a blank line. Returns
+    (text, chars removed).
+    """
+    overlap = min(first_end - second_start, len(second))
+    if overlap > 0:
+        return first + second[overlap:], overlap
+    if overlap == 0:
+        return first + second, 0
+    return first + "\n\n" + second, 0
+
+
+def merge_adjacent_chunks(docs: List) -> Tuple[List, int]:
+    """Merge retrieved chunks that are neighbours in the same document into contiguous spans.
+
+    Chunks are neighbours when they share a ``doc_id`` (unique per upload)
+    and have consecutive ``chunk_id``s; they are joined on their
+    ``start_char``/``end_char`` offsets. Chunks stored without offsets are
+    kept as they are. Each span keeps the rank of its best chunk and lists
+    its ``chunk_ids``. Returns the spans and the number of duplicate
+    characters removed.
+    """
+    from langchain_core.documents import Document
+
+    def key(doc):
+        return doc.metadata.get("doc_id"), doc.metadata.get("chunk_id")
+
+    by_key = {}
+    for doc in docs:
+        by_key.setdefault(key(doc), doc)
+
+    spans, used, removed = [], set(), 0
+    for doc in docs:
+        source, chunk_id = key(doc)
+        if (source, chunk_id) in used:
+            if by_key[(source, chunk_id)] is not doc:
+                removed += len(doc.page_content)  # the same chunk stored twice
+            continue
+        if source is None or chunk_id is None or "start_char" not in doc.metadata:
+            spans.append(doc)
+            continue
+
+        start = end = chunk_id
+        while (source, start - 1) in by_key:
+            start -= 1
+        while (source, end + 1) in by_key:
+            end += 1
+        run = [by_key[(source, i)] for i in range(start, end + 1)]
+        used.update((source, i) for i in range(start, end + 1))
+
+        text, text_end = run[0].page_content, run[0].metadata["end_char"]
+        for neighbour in run[1:]:
+            text, overlap = _stitch(text, text_end, neighbour.page_content, neighbour.metadata["start_char"])
+            text_end = neighbour.metadata["end_char"]
+            removed += overlap
+        spans.append(Document(
+            page_content=text,
+            metadata={**run[0].metadata, "end_char": text_end, "chunk_ids": list(range(start, end + 1))}
+        ))
+    return spans, removed
+
+
+def duplicate_chars(texts: List[str]) -> int:
+    """Characters in sentences that already appeared earlier in ``texts``."""
+    seen, duplicates = set(), 0
+    for text in texts:
+        for sentence in _SENTENCE_RE.split(text):
+            sentence = sentence.strip()
+            if not sentence:
+                continue
+            if sentence in seen:
+                duplicates += len(sentence)
+            seen.add(sentence)
+    return duplicates
 
 
 class VectorStoreManager:
     """Complete vector store implementation using ChromaDB."""
 
     def __init__(self):
-        self.embeddings = HuggingFaceEmbeddings(
-            model_name=EMBEDDING_MODEL,
-            model_kwargs={'device': 'cpu'},
-            encode_kwargs={'normalize_embeddings': True}
-        )
+        from helpers.embedding_cache import get_embeddings
+
+        self.logger = logging.getLogger(__name__)
+        self.telemetry = get_telemetry()
+        # Shared with LangChainHelper; repeated queries hit the query embedding cache
+        self.embeddings = get_embeddings()
         self.persist_directory = VECTORSTORE_PERSIST_DIR
         self.collection_name = COLLECTION_NAME
         self.vectorstore = None
@@ -23,6 +138,9 @@ class VectorStoreManager:
 
     def _initialize_vectorstore(self):
         """Initialize ChromaDB vector store."""
+        import chromadb
+        from langchain_community.vectorstores import Chroma
+
         try:
             # Ensure directory exists
             os.makedirs(self.persist_directory, exist_ok=True)
@@ -30,21 +148,33 @@ class VectorStoreManager:
             # Initialize ChromaDB client
             client = chromadb.PersistentClient(path=self.persist_directory)
 
-            # Create or get collection
+            # Create or get collection; HNSW parameters can only be set when it is created
+            existing = {collection.name for collection in client.list_collections()}
             self.vectorstore = Chroma(
                 client=client,
                 collection_name=self.collection_name,
                 embedding_function=self.embeddings,
-                persist_directory=self.persist_directory
+                persist_directory=self.persist_directory,
+                collection_metadata=None if self.collection_name in existing else HNSW_PARAMS
             )
+            self.logger.info(f"Collection '{self.collection_name}' HNSW settings: "
+                             f"{self.vectorstore._collection.metadata or 'defaults'}")
 
         except Exception as e:
-            print(f"Failed to initialize vector store: {e}")
+            self.logger.error(f"Failed to initialize vector store: {e}")
             raise
 
-    def add_document(self, chunks: List[str], metadata: Dict[str, Any]) -> str:
-        """Add document chunks to vector store."""
+    def add_document(self, chunks: List[str], metadata: Dict[str, Any],
+                     offsets: Optional[List[Tuple[int, int]]] = None) -> str:
+        """Add document chunks to vector store.
+
+        ``offsets`` are the chunks' (start, end) character offsets in the
+        document text; they let retrieval merge neighbouring chunks exactly.
+        """
         try:
+            # Unique per upload: the collection is shared, and file names are not unique.
+            doc_id = f"doc_{uuid.uuid4().hex}"
+
             # Create documents with metadata
             documents = []
             metadatas = []
@@ -53,21 +183,31 @@ class VectorStoreManager:
                 documents.append(chunk)
                 chunk_metadata = {
                     **metadata,
+                    "doc_id": doc_id,
                     "chunk_id": i,
                     "chunk_text": chunk[:100] + "..." if len(chunk) > 100 else chunk
                 }
+                if offsets is not None:
+                    chunk_metadata["start_char"], chunk_metadata["end_char"] = offsets[i]
                 metadatas.append(chunk_metadata)
 
-            # Add to vector store
-            self.vectorstore.add_texts(
-                texts=documents,
-                metadatas=metadatas
-            )
+            # Embed and insert as separate stages so both are visible in telemetry
+            with self.telemetry.span("embed", chunks=len(documents)):
+                embeddings = self.embeddings.embed_documents(documents)
 
-            return f"doc_{metadata['filename']}_{len(chunks)}_chunks"
+            with self.telemetry.span("vector_insert", chunks=len(documents)):
+                self.vectorstore._collection.upsert(
+                    ids=[str(uuid.uuid4()) for _ in documents],
+                    embeddings=embeddings,
+                    metadatas=metadatas,
+                    documents=documents
+                )
+
+            return doc_id
 
         except Exception as e:
-            print(f"Failed to add document to vector store: {e}")
+            self.logger.error(f"Failed to add document to vector store: {e}")
+            self.telemetry.incr("errors_total", stage="vector_insert")
             return None
 
     def get_vectorstore(self):
@@ -80,11 +220,47 @@ class VectorStoreManager:
             search_kwargs={"k": k}
         )
 
-    def search_documents(self, query: str, k: int = 3):
-        """Search for relevant documents."""
+    def search_documents(self, query: str, k: int = 3, mode: str = RETRIEVAL_MODE):
+        """Search for relevant documents ("similarity" or diverse "mmr" results)."""
         try:
-            docs = self.vectorstore.similarity_search(query, k=k)
+            with self.telemetry.span("retrieve", k=k, mode=mode):
+                if mode == "mmr":
+                    docs = self.mmr_search(query, k=k)
+                else:
+                    docs = self.vectorstore.similarity_search(query, k=k)
             return docs
         except Exception as e:
-            print(f"Search failed: {e}")
+            self.logger.error(f"Search failed: {e}")
+            return []
+
+    def mmr_search(self, query: str, k: int = 3, fetch_k: int = MMR_FETCH_K,
+                   lambda_mult: float = MMR_LAMBDA):
+        """Diverse top-``k`` results: MMR over ``fetch_k`` candidates, neighbours merged into spans."""
+        from langchain_core.documents import Document
+
+        query_embedding = self.embeddings.embed_query(query)
+        result = self.vectorstore._collection.query(
+            query_embeddings=[query_embedding],
+            n_results=fetch_k,
+            include=["embeddings", "documents", "metadatas"]
+        )
+        if not result["ids"][0]:
             return []
+
+        candidates = np.asarray(result["embeddings"][0], dtype=np.float32)
+        selected = maximal_marginal_relevance(np.asarray(query_embedding, dtype=np.float32),
+                                              candidates, k, lambda_mult)
+        docs = [Document(page_content=result["documents"][0][i], metadata=result["metadatas"][0][i])
+                for i in selected]
+        spans, removed = merge_adjacent_chunks(docs)
+
+        self.telemetry.incr("retrieval_duplicate_chars_total", removed, mode="mmr")
+        self.logger.info(f"MMR retrieval: {len(docs)} of {len(candidates)} candidates -> "
+                         f"{len(spans)} spans, {removed} duplicate chars removed")
+        return spans
+
+
+@lru_cache(maxsize=None)
+def get_vector_store() -> VectorStoreManager:
+    """Return the process-wide vector store shared by all sessions."""
+    return VectorStoreManager()
@@ -0,0 +1,78 @@
+import logging
+import threading
+import time
+from functools import lru_cache
+from typing import Dict, Optional
+
+from config.settings import ensure_data_dirs
+
+
+class WarmupState:
+    """Progress of the background warm-up that loads the heavy components."""
+
+    def __init__(self):
+        self.status = "pending"  # pending | loading | ready | failed
+        self.error: Optional[str] = None
+        self.timings: Dict[str, float] = {}
+        self._ready = threading.Event()
+
+    @property
+    def is_ready(self) -> bool:
+        return self._ready.is_set() and self.error is None
+
+    def wait(self, timeout: Optional[float] = None):
+        """Block until warm-up has finished; raise if it failed."""
+        if not self._ready.wait(timeout):
+            raise TimeoutError("Model warm-up is still running.")
+        if self.error:
+            raise RuntimeError(f"Model warm-up failed: {self.error}")
+
+
+def _warm_up(state: WarmupState):
+    """Import and build the shared components, then run one embed and one generate."""
+    logger = logging.getLogger(__name__)
+    state.status = "loading"
+    start = last = time.perf_counter()
+
+    def mark(step: str):
+        nonlocal last
+        now = time.perf_counter()
+        state.timings[step] = now - last
+        last = now
+
+    try:
+        ensure_data_dirs()
+
+        from helpers.langchain_helper import get_langchain_helper
+        from src.document_processor import get_document_processor
+        from src.vector_store import get_vector_store
+        mark("imports")
+
+        helper = get_langchain_helper()
+        mark("langchain_helper")
+        get_document_processor()
+        get_vector_store()
+        mark("vector_store")
+
+        helper.embeddings.embed_query("warm-up")
+        mark("dummy_embed")
+        helper.backend.generate("Hello", max_tokens=1)
+        mark("dummy_generate")
+
+        state.status = "ready"
+    except Exception as e:
+        logger.error(f"Warm-up failed: {e}")
+        state.error = str(e)
+        state.status = "failed"
+    finally:
+        state.timings["total"] = time.perf_counter() - start
+        logger.info(f"Warm-up {state.status} in {state.timings['total']:.1f}s: {state.timings}")
+        state._ready.set()
+
+
+@lru_cache(maxsize=None)
+def start_warmup() -> WarmupState:
+    """Start the process-wide warm-up once and return its state."""
+    state = WarmupState()
+    threading.Thread(target=_warm_up, args=(state,), name="warmup", daemon=True).start()
+    return state